@@ -2,38 +2,41 @@
 # Author: Ying Wang
 # Date: 2022/9/8
 
-import csv
 import itertools
 import time
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
 import requests
-from bs4 import BeautifulSoup
+
+from webcrawler.archive import RawArchive
+from webcrawler.columnar import ColumnBatch, TIME_FORMAT, save_batch
+from webcrawler.sessions import SessionPool, USER_AGENT
 
 
 class BaseBaidu:
 
-    def __init__(self):
+    def __init__(self, archive_dir: str = None):
         self.name = 'Baidu Base Crawler'
+        self.archive = RawArchive(archive_dir) if archive_dir else None  # raw responses, for re-parsing
         self.headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit'
-                          '/537.36 (KHTML, like Gecko) Chrome/69.0.3497.100 Safari/537.36',
+            'User-Agent': USER_AGENT,
         }
 
-    def _get_response(self, base_url: str, params: dict):
-        response = requests.get(base_url, headers=self.headers, params=params)
+    def _get_response(self, base_url: str, params: dict, session: requests.Session = None):
+        if session:
+            response = session.get(base_url, params=params)
+        else:
+            response = requests.get(base_url, headers=self.headers, params=params)
         response.encoding = 'utf-8'
+        if self.archive:
+            self.archive.append(response.url, response.content, kind='news', key=params.get('word', ''))
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, "html.parser")
         return soup
 
     @staticmethod
     def _save_data(result, output_path: str = None, csv_header: list = None):
-        if output_path:
-            with open(output_path, 'a', newline='', encoding='utf-8-sig') as fp:
-                csv_writer = csv.DictWriter(fp, csv_header)
-                if fp.tell() == 0:
-                    csv_writer.writeheader()
-                csv_writer.writerows(result)
+        save_batch(result, output_path, csv_header)
 
 
 class BaiduParser(BaseBaidu):
@@ -43,11 +46,11 @@ class BaiduParser(BaseBaidu):
         self.name = 'Baidu Parser'
 
     @staticmethod
-    def parse_news(soup: BeautifulSoup):
+    def parse_news(soup, crawl_time: str = None):
 
         news_items = soup.find("div", id="content_left").findAll("div", class_="result-op c-container xpath-log new-pmd")
 
-        news_results = []
+        news_results = ColumnBatch({name: [] for name in ['title', 'abstract', 'url', 'source', 'date']})
         for item in news_items:
 
             try:
@@ -55,15 +58,14 @@ class BaiduParser(BaseBaidu):
             except AttributeError:
                 date = None
 
-            news_result = {
-                'title': item.find("h3").find("a").text,
-                'abstract': item.find("div", class_="c-span-last").find("span", class_="c-color-text").text,
-                'url': item.find("h3").find("a")["href"],
-                'source': item.find("div", class_="c-span-last").find("span", class_="c-color-gray").text,
-                'date': date,
-                'crawl_time': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))
-            }
-            news_results.append(news_result)
+            link = item.find("h3").find("a")
+            info = item.find("div", class_="c-span-last")
+            news_results['title'].append(link.text)
+            news_results['abstract'].append(info.find("span", class_="c-color-text").text)
+            news_results['url'].append(link["href"])
+            news_results['source'].append(info.find("span", class_="c-color-gray").text)
+            news_results['date'].append(date)
+        news_results.insert(5, 'crawl_time', crawl_time or time.strftime(TIME_FORMAT, time.localtime()))
 
         csv_header = ['title', 'abstract', 'url', 'source', 'date', 'crawl_time', 'search_word']
 
@@ -72,48 +74,105 @@ class BaiduParser(BaseBaidu):
 
 class BaiduCrawler(BaseBaidu):
 
-    def __init__(self, cookie):
-        super().__init__()
+    def __init__(self, cookie: str = '', archive_dir: str = None, profiles: list = None, interval: float = 1.0):
+        """
+        :param cookie: str. your cookie after login.
+        :param archive_dir: str or None. directory to archive raw responses, for re-parsing.
+        :param profiles: list or None. identities to spread the searches over, [{'cookie': ..., 'user_agent': ...,
+                         'interval': ...}]. Defaults to the one cookie.
+        :param interval: float. default seconds between two searches of an identity.
+        """
+        super().__init__(archive_dir)
         self.name = 'Baidu Crawler'
         self.headers['Cookie'] = cookie
         self.parser = BaiduParser()
+        self.pool = SessionPool(profiles or [{'cookie': cookie}], interval=interval)
 
-    def search_news(self, words: list, pages: int, output_path: str = None):
+    @staticmethod
+    def _check_page(soup):
+        """ 'captcha' if the identity is blocked, 'empty' if there is no result, else 'ok' """
+        content = soup.find("div", id="content_left")
+        if content is None or (soup.title and '安全验证' in soup.title.text):
+            return 'captcha'
+        if not content.find("div", class_="result-op c-container xpath-log new-pmd"):
+            return 'empty'
+        return 'ok'
+
+    def _search_page(self, word: str, page: int, retries: int):
+        """
+        search one page with the least-loaded healthy identity, retrying blocked or empty pages with other identities
+        :return: a ColumnBatch of results and the csv header, or (None, None) if the page is blocked for all retries
+        """
+        params = {
+            'rtt': 1,
+            'bsst': 1,
+            'cl': 2,
+            'tn': 'news',
+            'rsv_dl': 'ns_pc',
+            'word': word,
+            'pn': page
+        }  # TODO different params
+
+        empty = []  # distinct identities finding no result, suspect if another identity finds results
+        for attempt in range(retries + 1):
+            with self.pool.session() as identity:
+                identity.limiter.wait()
+                news_soup = self._get_response(base_url='https://www.baidu.com/s', params=params,
+                                               session=identity.session)
+            status = self._check_page(news_soup)
+            if status == 'ok':
+                self.pool.succeed(identity)
+                for suspect in empty:
+                    self.pool.fail(suspect, f'empty page of word: {word}, page: {page + 1}')
+                break
+            if status == 'captcha':
+                self.pool.fail(identity, f'captcha page of word: {word}, page: {page + 1}', quarantine=True)
+                continue
+            if identity not in empty:  # the same identity again, while the others are quarantined
+                empty.append(identity)
+            if len(empty) >= len(self.pool):  # no other identity to ask, the page has no result
+                break
+        else:
+            if status == 'captcha':
+                print(f'failed to get result from word: {word}, page: {page + 1}, blocked for {retries + 1} times')
+                return None, None
+
+        news_results, csv_header = self.parser.parse_news(news_soup)
+        news_results.insert(len(news_results.header), 'search_word', word)
+        return news_results, csv_header
+
+    def search_news(self, words: list, pages: int, output_path: str = None, as_frame: bool = True,
+                    retries: int = 2):
 
         """
         :param words: list. a list of words used to search.
         :param pages: int. how many pages you want to crawl.
         :param output_path: str or None. Path used to save data. Defaults to None.
+        :param as_frame: bool. return a pandas.DataFrame if True, else a ColumnBatch (without importing pandas).
+        :param retries: int. times to retry a blocked or empty page with another identity.
         :return: a pandas.DataFrame of results.
         """
-        base_url = 'https://www.baidu.com/s'
-
         all_news = []
-        for word, page in itertools.product(words, range(pages)):
-
-            params = {
-                'rtt': 1,
-                'bsst': 1,
-                'cl': 2,
-                'tn': 'news',
-                'rsv_dl': 'ns_pc',
-                'word': word,
-                'pn': page
-            }  # TODO different params
-
-            news_soup = self._get_response(base_url=base_url, params=params)
-            news_results, csv_header = self.parser.parse_news(news_soup)
-            news_results = [dict(item, **{'search_word': word}) for item in news_results]
-            all_news.extend(news_results)
-
-            if output_path:
-                self._save_data(news_results, output_path=output_path, csv_header=csv_header)
-                print(f'Successfully save result to {output_path} from word: {word}, page: {page + 1}')
-            else:
-                print(f'Successfully get result from word: {word}, page: {page + 1}')
-
-        all_news_df = pd.DataFrame(all_news)
-        return all_news_df
+        # one thread per identity; results are saved here, in the order of words and pages
+        with ThreadPoolExecutor(len(self.pool)) as executor:
+            futures = [(word, page, executor.submit(self._search_page, word, page, retries))
+                       for word, page in itertools.product(words, range(pages))]
+            for word, page, future in futures:
+                news_results, csv_header = future.result()
+                if news_results is None:
+                    continue
+                all_news.append(news_results)
+
+                if output_path:
+                    self._save_data(news_results, output_path=output_path, csv_header=csv_header)
+                    print(f'Successfully save result to {output_path} from word: {word}, page: {page + 1}')
+                else:
+                    print(f'Successfully get result from word: {word}, page: {page + 1}')
+
+        if len(self.pool) > 1:
+            print(self.pool.report())
+        all_news = ColumnBatch.concat(all_news)
+        return all_news.to_frame() if as_frame else all_news
 
 
 if __name__ == '__main__':
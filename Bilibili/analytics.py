@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+bullet and comment analytics over crawled results, computed with numpy chunk by chunk,
+so memory is bounded by the chunk size and the aggregates, not by the number of rows, e.g.
+    activity = analyze(['Bilibili/result_BilibiliBullets.csv'], kind='bullet',
+                       videos='Bilibili/result_BilibiliVideoDetails.csv')
+    activity.timeline  # bullets per 1% of each video
+    activity.peaks().to_frame()  # minutes with bursts of bullets
+or from the command line:
+    python -m Bilibili.analytics Bilibili/result_BilibiliBullets.csv --videos Bilibili/result_BilibiliVideoDetails.csv
+chunks are read from csv files (pandas) or parquet files (needs `pip install pyarrow`) with typed columns:
+float64 bullet_entry, and int64 times (seconds since 1970-01-01 in local time, as written in the csv files).
+"""
+
+import argparse
+
+import numpy as np
+
+from webcrawler.columnar import ColumnBatch, TIME_FORMAT
+
+# columns of each kind of results: bvid, post time, user, and the seconds of the video (bullets only)
+COLUMNS = {
+    'bullet': {'bvid': 'bvid', 'time': 'bullet_time', 'user': 'bullet_user', 'entry': 'bullet_entry'},
+    'comment': {'bvid': 'bvid', 'time': 'comment_time', 'user': 'comment_user_id', 'entry': None},
+}
+# base of the user column: hex crc32 hashes of bullet users, decimal ids of comment users
+USER_BASE = {'bullet': 16, 'comment': 10}
+
+
+def read_chunks(path: str, columns: list, chunk_rows: int = 1000000):
+    """
+    read columns of a csv or parquet file chunk by chunk. columns missing in the file are left out
+    :param path: path of a .csv or .parquet file
+    :param columns: names of the columns to read
+    :param chunk_rows: rows of a chunk
+    :return: an iterator of pandas.DataFrame
+    """
+    if path.endswith('.parquet'):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError('reading parquet files needs pyarrow, please `pip install pyarrow`')
+        parquet = pq.ParquetFile(path)
+        names = [column for column in columns if column in parquet.schema_arrow.names]
+        for batch in parquet.iter_batches(batch_size=chunk_rows, columns=names):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+        names = [column for column in columns if column in pd.read_csv(path, nrows=0, encoding='utf-8-sig').columns]
+        dtype = {column: str for column in names if column != COLUMNS['bullet']['entry']}
+        yield from pd.read_csv(path, usecols=names, dtype=dtype, encoding='utf-8-sig', chunksize=chunk_rows)
+
+
+def to_seconds(times):
+    """ TIME_FORMAT strings or datetimes to int64 seconds since 1970-01-01 (local time), -1 for missing times """
+    import pandas as pd
+    values = np.asarray(times)
+    if values.dtype.kind != 'M':
+        values = pd.to_datetime(pd.Series(times), format=TIME_FORMAT, errors='coerce').to_numpy()
+    seconds = values.astype('datetime64[s]').view(np.int64)
+    return np.where(np.isnat(values), -1, seconds)
+
+
+def load_durations(path: str):
+    """
+    :param path: video details from BilibiliCrawler.crawl_video(), csv or parquet
+    :return: a dict of bvid -> duration in seconds
+    """
+    durations = {}
+    for chunk in read_chunks(path, ['bvid', 'duration']):
+        durations.update(zip(chunk['bvid'].tolist(), chunk['duration'].astype(float).tolist()))
+    return durations
+
+
+def find_peaks(counts, window: int = 60, threshold: float = 3.0):
+    """
+    rolling peak detection: values above the mean of the previous `window` values by `threshold` standard deviations
+    (at least 1), which are also local maxima
+    :param counts: a 1-d array, or a 2-d array with series in rows
+    :param window: number of previous values in the baseline
+    :param threshold: z-score of a peak
+    :return: a boolean mask of peaks, and the z-scores, both the shape of counts
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    n = counts.shape[-1]
+    zeros = np.zeros(counts.shape[:-1] + (1,))
+    total = np.concatenate([zeros, np.cumsum(counts, axis=-1)], axis=-1)
+    squares = np.concatenate([zeros, np.cumsum(counts ** 2, axis=-1)], axis=-1)
+    index = np.arange(n)
+    start = np.maximum(index - window, 0)
+    size = np.maximum(index - start, 1)
+    mean = (total[..., index] - total[..., start]) / size
+    std = np.sqrt(np.maximum((squares[..., index] - squares[..., start]) / size - mean ** 2, 0))
+    zscores = (counts - mean) / np.maximum(std, 1)
+    padded = np.pad(counts, [(0, 0)] * (counts.ndim - 1) + [(1, 1)], constant_values=-np.inf)
+    local = (counts >= padded[..., :-2]) & (counts >= padded[..., 2:])
+    return (zscores > threshold) & local & (index > 0), zscores
+
+
+def find_sparse_peaks(keys, counts, window: int = 60, threshold: float = 3.0):
+    """
+    find_peaks() over a sparse series: counts at sorted int64 keys (e.g. minutes), 0 at the keys in between.
+    only the given keys are looked at, so time and memory grow with the number of keys, not with their range
+    :param keys: a sorted 1-d array of distinct keys
+    :param counts: a 1-d array of the counts at the keys
+    :param window: number of previous keys (with or without counts) in the baseline
+    :param threshold: z-score of a peak
+    :return: a boolean mask of peaks, and the z-scores, both the shape of counts
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.float64)
+    if not len(keys):
+        return np.zeros(0, dtype=bool), np.zeros(0)
+    total = np.concatenate([[0], np.cumsum(counts)])
+    squares = np.concatenate([[0], np.cumsum(counts ** 2)])
+    index = np.arange(len(keys))
+    start = np.searchsorted(keys, keys - window)  # the first key in the window
+    size = np.maximum(np.minimum(keys - keys[0], window), 1)
+    mean = (total[index] - total[start]) / size
+    std = np.sqrt(np.maximum((squares[index] - squares[start]) / size - mean ** 2, 0))
+    zscores = (counts - mean) / np.maximum(std, 1)
+    adjacent = np.diff(keys) == 1
+    previous = np.where(np.concatenate([[False], adjacent]), np.concatenate([[0], counts[:-1]]), 0)
+    following = np.where(np.concatenate([adjacent, [False]]), np.concatenate([counts[1:], [0]]), 0)
+    local = (counts >= previous) & (counts >= following)
+    return (zscores > threshold) & local & (keys > keys[0]), zscores
+
+
+class _SparseCounter:
+    """ counts of int64 values (e.g. minutes) in sorted key / count arrays, growing with the distinct values seen """
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, values):
+        if not len(values):
+            return
+        keys, inverse = np.unique(np.concatenate([self.keys, values]), return_inverse=True)
+        weights = np.concatenate([self.counts, np.ones(len(values), dtype=np.int64)])
+        self.keys = keys
+        self.counts = np.bincount(inverse.reshape(-1), weights=weights, minlength=len(keys)).astype(np.int64)
+
+
+class _HeavyHitters:
+    """
+    posts per user in int64 arrays of at most `capacity` users, merged chunk by chunk (a Misra-Gries summary).
+    counts are exact while there are at most `capacity` distinct users; beyond that, the users with few posts are
+    dropped and every count may be short by at most `error`, so the most active users are still found
+    """
+
+    def __init__(self, capacity: int = 1000000):
+        self.capacity = capacity
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.error = 0
+
+    def add(self, keys, counts):
+        keys, inverse = np.unique(np.concatenate([self.keys, keys]), return_inverse=True)
+        counts = np.bincount(inverse.reshape(-1), weights=np.concatenate([self.counts, counts]),
+                             minlength=len(keys)).astype(np.int64)
+        if len(keys) > self.capacity:
+            cut = int(np.partition(counts, len(counts) - self.capacity - 1)[len(counts) - self.capacity - 1])
+            counts -= cut
+            kept = counts > 0
+            keys, counts = keys[kept], counts[kept]
+            self.error += cut
+        self.keys, self.counts = keys, counts
+
+    def top(self, n: int):
+        order = np.lexsort((self.keys, -self.counts))[:n]
+        return self.keys[order], self.counts[order]
+
+
+class Activity:
+    """
+    aggregates of bullets or comments, updated chunk by chunk:
+        rows: rows aggregated
+        timeline: bullets per bin of each video, a (videos, bins) array in the order of `bvids`
+        hours: posts per hour of the day (0-23), weekdays: posts per day of the week (0 = Monday)
+        users: posts per user, see top_users()
+    """
+
+    def __init__(self, kind: str = 'bullet', durations: dict = None, bins: int = 100, max_users: int = 1000000):
+        """
+        :param kind: 'bullet' or 'comment'
+        :param durations: bvid -> duration in seconds, for the bullet timelines. see load_durations()
+        :param bins: bins of the timeline of a video, each 1 / bins of the duration
+        :param max_users: users counted in memory (16 bytes each), exact up to this number of distinct users
+        """
+        if kind not in COLUMNS:
+            raise ValueError(f'ERROR: kind {kind} can not be analyzed! Please use one of {list(COLUMNS)}')
+        self.columns = COLUMNS[kind]
+        self.user_base = USER_BASE[kind]
+        self.bins = bins
+        self.bvids = list(durations or {})
+        self._durations = np.array([durations[bvid] for bvid in self.bvids], dtype=np.float64)
+        self.timeline = np.zeros((len(self.bvids), bins), dtype=np.int64)
+        self.hours = np.zeros(24, dtype=np.int64)
+        self.weekdays = np.zeros(7, dtype=np.int64)
+        self.users = _HeavyHitters(max_users)
+        self.rows = 0
+        self.unmatched = 0  # bullets of videos without a duration, not in the timeline
+        self._minutes = _SparseCounter()
+
+    def update(self, chunk):
+        """
+        :param chunk: a pandas.DataFrame (or a dict of arrays) with the columns of the kind
+        """
+        columns = self.columns
+        self.rows += len(chunk[columns['bvid']])
+
+        seconds = to_seconds(chunk[columns['time']])
+        seconds = seconds[seconds >= 0]
+        self._minutes.add(seconds // 60)
+        self.hours += np.bincount(seconds // 3600 % 24, minlength=24)
+        self.weekdays += np.bincount((seconds // 86400 + 3) % 7, minlength=7)  # 1970-01-01 is a Thursday
+
+        if columns['user'] in chunk:
+            import pandas as pd
+            # users of the chunk as int64 keys; only the distinct users are converted from strings
+            codes, users = pd.factorize(pd.Series(chunk[columns['user']]))
+            keys = np.array([int(str(user), self.user_base) for user in users], dtype=np.int64)
+            self.users.add(keys, np.bincount(codes[codes >= 0], minlength=len(keys)))
+
+        if columns['entry'] and columns['entry'] in chunk and self.bvids:
+            import pandas as pd
+            videos = pd.Index(self.bvids).get_indexer(np.asarray(chunk[columns['bvid']], dtype=object))
+            entries = np.asarray(chunk[columns['entry']], dtype=np.float64)
+            known = (videos >= 0) & ~np.isnan(entries)
+            self.unmatched += int(np.count_nonzero(videos < 0))
+            videos, entries = videos[known], entries[known]
+            positions = np.clip((entries / np.maximum(self._durations[videos], 1) * self.bins).astype(np.int64),
+                                0, self.bins - 1)
+            self.timeline += np.bincount(videos * self.bins + positions,
+                                         minlength=self.timeline.size).reshape(self.timeline.shape)
+        return self
+
+    @property
+    def minutes(self):
+        """ posts per minute: the minutes with posts (datetime64), and their counts """
+        return (self._minutes.keys * 60).astype('datetime64[s]'), self._minutes.counts
+
+    def peaks(self, window: int = 60, threshold: float = 3.0):
+        """
+        minutes with bursts of posts, see find_sparse_peaks()
+        :return: a ColumnBatch of minute, count and zscore
+        """
+        mask, zscores = find_sparse_peaks(self._minutes.keys, self._minutes.counts, window, threshold)
+        minutes, counts = self.minutes
+        return ColumnBatch({'minute': minutes[mask], 'count': counts[mask], 'zscore': zscores[mask]})
+
+    def timeline_peaks(self, window: int = 10, threshold: float = 3.0):
+        """
+        moments of videos with bursts of bullets, see find_peaks()
+        :return: a ColumnBatch of bvid, entry (start of the bin, in seconds of the video), count and zscore
+        """
+        mask, zscores = find_peaks(self.timeline, window, threshold)
+        videos, positions = np.nonzero(mask)
+        return ColumnBatch({'bvid': [self.bvids[video] for video in videos.tolist()],
+                            'entry': self._durations[videos] * positions / self.bins,
+                            'count': self.timeline[videos, positions], 'zscore': zscores[videos, positions]})
+
+    def top_users(self, n: int = 10):
+        """
+        :return: a ColumnBatch of the n users with the most posts (hex hashes of bullet users, ids of comment users).
+                 counts are lower bounds, short by at most `users.error` once there were more than max_users users
+        """
+        keys, counts = self.users.top(n)
+        users = [format(key, 'x') for key in keys.tolist()] if self.user_base == 16 else keys
+        return ColumnBatch({'user': users, 'count': counts})
+
+
+def analyze(paths: list, kind: str = 'bullet', videos=None, bins: int = 100, chunk_rows: int = 1000000,
+            max_users: int = 1000000):
+    """
+    aggregate bullets or comments from csv / parquet files, chunk by chunk
+    :param paths: paths of the results from crawl_bullet() or crawl_comment()
+    :param kind: 'bullet' or 'comment'
+    :param videos: path of the video details from crawl_video(), or a dict of bvid -> duration, for bullet timelines
+    :param bins: bins of the timeline of a video
+    :param chunk_rows: rows of a chunk
+    :param max_users: users counted in memory, see Activity
+    :return: an Activity
+    """
+    durations = load_durations(videos) if isinstance(videos, str) else videos
+    activity = Activity(kind, durations, bins, max_users)
+    columns = [column for column in COLUMNS[kind].values() if column]
+    for path in [paths] if isinstance(paths, str) else paths:
+        for chunk in read_chunks(path, columns, chunk_rows):
+            activity.update(chunk)
+    return activity
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='bullet and comment analytics over crawled results')
+    arg_parser.add_argument('paths', nargs='+', help='csv or parquet results of crawl_bullet() or crawl_comment()')
+    arg_parser.add_argument('--kind', choices=list(COLUMNS), default='bullet', help='bullets (default) or comments')
+    arg_parser.add_argument('--videos', help='video details of crawl_video(), for the bullet timelines')
+    arg_parser.add_argument('--bins', type=int, default=100, help='bins of the timeline of a video')
+    arg_parser.add_argument('--chunk-rows', type=int, default=1000000, help='rows read at a time')
+    arg_parser.add_argument('--max-users', type=int, default=1000000, help='users counted in memory')
+    args = arg_parser.parse_args()
+
+    result = analyze(args.paths, args.kind, args.videos, args.bins, args.chunk_rows, args.max_users)
+    print(f'{result.rows} {args.kind}s')
+    print('posts per hour:', result.hours.tolist())
+    print('posts per weekday:', result.weekdays.tolist())
+    print('peak minutes:')
+    for row in result.peaks().rows():
+        print(*row, sep='\t')
+    if result.bvids:
+        print(f'timeline peaks ({result.unmatched} {args.kind}s of videos without duration):')
+        for row in result.timeline_peaks().rows():
+            print(*row, sep='\t')
+    print('top users:' + (f' (counts short by at most {result.users.error})' if result.users.error else ''))
+    for row in result.top_users().rows():
+        print(*row, sep='\t')
@@ -2,19 +2,29 @@
 # Author: Ying Wang
 # Date: 2022/9/5
 
-import csv
 import json
+import math
 import time
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-import pandas as pd
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
+
+from webcrawler.archive import RawArchive
+from webcrawler.columnar import ColumnBatch, DictColumn, TIME_FORMAT, format_epoch, local_datetime, repeat, save_batch
+from webcrawler.http_cache import HttpCache, http_get
+from webcrawler.protobuf import iter_fields
+from webcrawler.ratelimit import RateLimiter
 
 
 class BaseBilibili:
-    def __init__(self):
+    # cache ttl (seconds) of endpoints sending no cache headers, {url regex: seconds}
+    cache_ttl = {r'comment\.bilibili\.com/\d+\.xml': 6 * 3600, r'/x/v2/dm/web/seg\.so\?': 6 * 3600}
+
+    def __init__(self, archive_dir: str = None, cache_dir: str = None, cache_ttl: dict = None):
         self.name = 'Bilibili Base Crawler'
+        self.archive = RawArchive(archive_dir) if archive_dir else None  # raw responses, for re-parsing
+        self.cache = HttpCache(cache_dir, ttl=cache_ttl or self.cache_ttl) if cache_dir else None
         self.headers = {
             'accept': '*/*',
             'accept-encoding': 'gzip, deflate, br',
@@ -53,19 +63,31 @@ class BaseBilibili:
         }
         response = requests.get(url, headers=headers, params=params)
         response.encoding = 'utf-8'
+        if self.archive:
+            self.archive.append(response.url, response.content, kind='channel', key=channel_url)
         channel_json = json.loads(response.text)
         return channel_json
 
-    def get_video(self, bvid: str):
+    def get_video(self, bvid: str, archive: bool = True):
         """
         get responses from a video page
         :param bvid: the bvid of the video
+        :param archive: keep the page in the archive. False for looking up the avid / cid of a video
         :return: a json result of video details, and a json result of uploader information
         """
         video_url = f'https://www.bilibili.com/video/{bvid}'
         response = requests.get(video_url, headers=self.headers)
-        raw_data = response.text
+        if self.archive and archive:
+            self.archive.append(response.url, response.content, kind='video', key=bvid)
+        return self._extract_video(response.text)
 
+    @staticmethod
+    def _extract_video(raw_data: str):
+        """
+        extract video details and uploader information from the html of a video page
+        :param raw_data: the html of a video page
+        :return: a json result of video details, and a json result of uploader information
+        """
         # video information
         video_text = raw_data[raw_data.index("\"videoData\":") + 12: raw_data.index(",\"upData\"")]
         video_json = json.loads(video_text)
@@ -76,16 +98,17 @@ class BaseBilibili:
 
         return video_json, uploader_json
 
-    def get_comment(self, bvid: str, page: int = 0):
+    def get_comment(self, bvid: str, page: int = 0, avid: int = None):
         """
         get responses from video comments
         :param bvid: the bvid of the video
         :param page: page
+        :param avid: the avid of the video, looked up from the video page if not given
         :return: a json result of all comments from the video
         """
         url = 'https://api.bilibili.com/x/v2/reply/main'
         headers = self.headers.update({'referer': f'https://www.bilibili.com/video/{bvid}'})
-        avid = self._get_avid(bvid)
+        avid = avid or self._get_avid(bvid)
 
         params = {
             'next': page,
@@ -95,24 +118,131 @@ class BaseBilibili:
 
         response = requests.get(url, headers=headers, params=params)
         response.encoding = 'utf-8'
+        if self.archive:
+            self.archive.append(response.url, response.content, kind='comment', key=bvid)
         comment_json = json.loads(response.text)
 
         return comment_json
 
-    def get_bullet(self, bvid: str):
+    def get_reply(self, avid: int, root: int, page: int = 1, bvid: str = ''):
+        """
+        get responses from the replies of a comment
+        :param avid: the avid of the video
+        :param root: the comment id of the thread
+        :param page: page, starting from 1
+        :param bvid: the bvid of the video, for the referer
+        :return: a json result of one page of replies
+        """
+        url = 'https://api.bilibili.com/x/v2/reply/reply'
+        headers = {**self.headers, 'referer': f'https://www.bilibili.com/video/{bvid}'}
+        params = {
+            'type': 1,
+            'oid': avid,
+            'root': root,
+            'pn': page,
+            'ps': 20
+        }
+
+        response = requests.get(url, headers=headers, params=params)
+        response.encoding = 'utf-8'
+        if self.archive:
+            self.archive.append(response.url, response.content, kind='reply', key=bvid)
+        reply_json = json.loads(response.text)
+
+        return reply_json
+
+    def get_bullet(self, bvid: str, cid: int = None):
         """
         get responses from video bullets
         :param bvid: the bvid of the video
+        :param cid: the cid of the video, looked up from the video page if not given
         :return: a BeautifulSoup result of all bullet comments from the video
         """
-        cid = self._get_cid(bvid)
+        cid = cid or self._get_cid(bvid)
         url = f'https://comment.bilibili.com/{cid}.xml'
-        response = requests.get(url, headers=self.headers)
+        # an error page is not cached as the bullets of the video
+        response = http_get(url, self.cache, headers=self.headers,
+                            validate=lambda response: 'xml' in response.headers.get('content-type', ''))
         response.encoding = 'utf-8'
-        bullet_soup = BeautifulSoup(response.text, "xml")
+        if self.archive and not getattr(response, 'from_cache', False):
+            self.archive.append(response.url, response.content, kind='bullet', key=bvid)
+        if self.cache:
+            return self.cache.parse(response, 'bullet', self._extract_bullet)
+        return self._extract_bullet(response.text)
+
+    @staticmethod
+    def _extract_bullet(xml_text: str):
+        """
+        extract bullets from the xml of a video
+        :param xml_text: the xml of bullets
+        :return: a BeautifulSoup result of all bullet comments
+        """
+        from bs4 import BeautifulSoup
+        bullet_soup = BeautifulSoup(xml_text, "xml")
         bullet_result = bullet_soup.find_all("d")
         return bullet_result
 
+    def get_bullet_segments(self, bvid: str, threads: int = 4, video_json: dict = None):
+        """
+        get all bullets from the segmented protobuf stream (one segment per 6 minutes), segments downloaded concurrently
+        :param bvid: the bvid of the video
+        :param threads: number of threads to download segments
+        :param video_json: video details from get_video(), looked up from the video page if not given
+        :return: a list of segments, each a list of (bullet id, entry in ms, post time, content)
+        """
+        video_json = video_json or self.get_video(bvid, archive=False)[0]
+        duration = (video_json.get('pages') or [video_json])[0]['duration']  # duration of the first part (cid)
+        segments = max(1, math.ceil(duration / 360))
+        with ThreadPoolExecutor(min(threads, segments)) as pool:
+            return list(pool.map(
+                lambda index: self.get_bullet_segment(video_json['cid'], video_json['aid'], index, bvid),
+                range(1, segments + 1)))
+
+    def get_bullet_segment(self, cid: int, avid: int, segment_index: int, bvid: str = ''):
+        """
+        get one 6-minute segment of bullets in protobuf
+        :param cid: the cid of the video
+        :param avid: the avid of the video
+        :param segment_index: index of the segment, starting from 1
+        :param bvid: the bvid of the video, for the archive
+        :return: a list of (bullet id, entry in ms, post time, content)
+        """
+        url = 'https://api.bilibili.com/x/v2/dm/web/seg.so'
+        params = {
+            'type': 1,
+            'oid': cid,
+            'pid': avid,
+            'segment_index': segment_index
+        }
+        response = http_get(url, self.cache, headers=self.headers, params=params, validate=self._is_segment)
+        if not self._is_segment(response):
+            raise ValueError(f'ERROR: failed to get bullet segment {segment_index} of video {bvid}: '
+                             f'{response.status_code} {response.text[:100]}')
+        if self.archive and not getattr(response, 'from_cache', False):
+            self.archive.append(response.url, response.content, kind='bullet_segment', key=bvid)
+        return self._extract_bullet_segment(response.content)
+
+    @staticmethod
+    def _is_segment(response):
+        """ a protobuf segment, not an error (a json body is an api error, e.g. a throttled request) """
+        return response.status_code == 200 and 'json' not in response.headers.get('content-type', '')
+
+    @staticmethod
+    def _extract_bullet_segment(content: bytes):
+        """
+        decode a protobuf segment of bullets (DmSegMobileReply, bullets in repeated field 1)
+        :param content: the protobuf content
+        :return: a list of (bullet id, entry in ms, post time, content, user hash). post time is None if missing
+        """
+        bullets = []
+        for field, elem in iter_fields(content):
+            if field == 1:
+                # DanmakuElem: 1 id, 2 progress (ms), 6 midHash, 7 content, 8 ctime
+                bullet = dict(iter_fields(elem))
+                bullets.append((bullet.get(1, 0), bullet.get(2, 0), bullet.get(8),
+                                bytes(bullet.get(7, b'')).decode('utf-8'), bytes(bullet.get(6, b'')).decode('ascii')))
+        return bullets
+
     def _get_channel_id(self, channel_url: str):
         """
         get the channel id from a channel. for crawling channel videos
@@ -121,6 +251,7 @@ class BaseBilibili:
         """
         headers = self.headers.update({'referer': channel_url})
         response = requests.get(channel_url, headers=headers)
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, "html")
         channel_id = int(list(filter(None, soup.find('link', rel='alternate').attrs['href'].split('/')))[-1])
         return channel_id
@@ -131,7 +262,7 @@ class BaseBilibili:
         :param bvid: the bvid of the video
         :return: the avid of the video
         """
-        video_json, _ = self.get_video(bvid)
+        video_json, _ = self.get_video(bvid, archive=False)
         return video_json['aid']
 
     def _get_cid(self, bvid: str):
@@ -140,24 +271,19 @@ class BaseBilibili:
         :param bvid: the bvid of the video
         :return: the cid of the video
         """
-        video_json, _ = self.get_video(bvid)
+        video_json, _ = self.get_video(bvid, archive=False)
         return video_json['cid']
 
     @staticmethod
     def save_data(result, output_path: str = None, csv_header: list = None):
         """
         to save crawl result in a csv file.
-        :param result: a pandas.DataFrame result
+        :param result: a ColumnBatch (or a list of dicts) result
         :param output_path: path to save the csv file
         :param csv_header: headers of the csv
         :return: None. (a csv file saved in the output path)
         """
-        if output_path:
-            with open(output_path, 'a', newline='', encoding='utf-8-sig') as fp:
-                csv_writer = csv.DictWriter(fp, csv_header)
-                if fp.tell() == 0:
-                    csv_writer.writeheader()
-                csv_writer.writerows(result)
+        save_batch(result, output_path, csv_header)
 
 
 class BilibiliParser(BaseBilibili):
@@ -166,37 +292,40 @@ class BilibiliParser(BaseBilibili):
         self.name = "Bilibili Parser"
 
     @staticmethod
-    def parser_channel(channel_json):
+    def parser_channel(channel_json, crawl_time: str = None):
         """
         parse channel result
         :param channel_json: a json result from get_channel()
-        :return: a list of structured results extracted from the json file, and a list of names as the csv header
+        :param crawl_time: the time the page was fetched, default to now
+        :return: a ColumnBatch of structured results extracted from the json file, and a list of names as the csv header
         """
         channel_result = channel_json['result']
-        videos = []
-        for video in channel_result:
-            videos.append({'bvid': video['bvid'],  # bvid
-                           'url': video['arcurl'],  # video url
-                           'tags': video['tag'],  # video tags
-                           'channel_crawl_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())})
+        crawl_time = crawl_time or time.strftime(TIME_FORMAT, time.localtime())
+        videos = ColumnBatch({
+            'bvid': [video['bvid'] for video in channel_result],  # bvid
+            'url': [video['arcurl'] for video in channel_result],  # video url
+            'tags': [video['tag'] for video in channel_result],  # video tags
+            'channel_crawl_time': repeat(crawl_time, len(channel_result))
+        })
         csv_header = ['bvid', 'url', 'tags', 'channel_crawl_time']
         return videos, csv_header
 
     @staticmethod
-    def parser_video(video_json, uploader_json):
+    def parser_video(video_json, uploader_json, crawl_time: str = None):
         """
         parse video details and uploader information
         :param video_json: a json result from get_video()
         :param uploader_json: a json result from get_video()
-        :return: a list of structured results extracted from the json files, and a list of names as the csv header
+        :param crawl_time: the time the page was fetched, default to now
+        :return: a one-row ColumnBatch of results extracted from the json files, and a list of names as the csv header
         """
-        video_detail = [{
+        video_detail = ColumnBatch.from_records([{
             # video info
             'bvid': video_json['bvid'],  # bvid
             'avid': video_json['aid'],  # avid, for crawling comments
             'cid': video_json['cid'],  # cid, for crawling bullets
             'title': video_json['title'],   # video title
-            'pubdate': datetime.fromtimestamp(video_json['pubdate']).strftime("%Y-%m-%d %H:%M:%S"),  # upload datetime
+            'pubdate': format_epoch([video_json['pubdate']])[0],  # upload datetime
             'duration': video_json['duration'],  # duration of the video, in seconds
             'views': video_json['stat']['view'],  # number of views
             'likes': video_json['stat']['like'],  # number of likes
@@ -217,8 +346,8 @@ class BilibiliParser(BaseBilibili):
             'up_official': uploader_json['Official']['title'],  # certification info of the uploader
             'up_archives': uploader_json['archiveCount'],  # total number of videos uploaded by the uploader
 
-            'video_crawl_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        }]
+            'video_crawl_time': crawl_time or time.strftime(TIME_FORMAT, time.localtime())
+        }])
 
         csv_header = ['avid', 'bvid', 'cid', 'title', 'pubdate', 'duration',
                       'views', 'likes', 'coins', 'shares', 'favorites', 'bullets', 'comments',
@@ -227,72 +356,109 @@ class BilibiliParser(BaseBilibili):
         return video_detail, csv_header
 
     @staticmethod
-    def parser_comment(comment_result):
+    def parser_comment(comment_result, crawl_time: str = None):
         """
         parse comments
         :param comment_result: result extracted from comment_json['data']['replies']
-        :return: a list of structured results extracted from the json file, and a list of names as the csv header
-        """
-        comments = []
-        for comment in comment_result:
-            comment_detail = {
-                'comment_id': comment['rpid'],  # comment id
-                'comment_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(comment['ctime'])),  # time post the comment
-                'comment_user_id': comment['member']['mid'],   # user id
-                'comment_user_name': comment['member']['uname'],  # user name
-                'comment_content': comment['content']['message'],  # comment content
-                'comment_likes': comment['like'],   # number of likes of the comment
-                'comment_crawler_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-            }
-            comments.append(comment_detail)
+        :param crawl_time: the time the page was fetched, default to now
+        :return: a ColumnBatch of structured results extracted from the json file, and a list of names as the csv header
+        """
+        crawl_time = crawl_time or time.strftime(TIME_FORMAT, time.localtime())
+        comments = ColumnBatch({
+            'comment_id': np.array([comment['rpid'] for comment in comment_result], dtype=np.int64),  # comment id
+            'comment_time': local_datetime([comment['ctime'] for comment in comment_result]),  # time post the comment
+            'comment_user_id': [comment['member']['mid'] for comment in comment_result],   # user id
+            'comment_user_name': [comment['member']['uname'] for comment in comment_result],  # user name
+            'comment_content': [comment['content']['message'] for comment in comment_result],  # comment content
+            'comment_likes': np.array([comment['like'] for comment in comment_result],
+                                      dtype=np.int64),   # number of likes of the comment
+            'comment_crawler_time': repeat(crawl_time, len(comment_result)),
+            # comment id of the thread (0 for top-level comments), and of the comment replied to
+            'comment_root': np.array([comment.get('root', 0) for comment in comment_result], dtype=np.int64),
+            'comment_parent': np.array([comment.get('parent', 0) for comment in comment_result], dtype=np.int64)
+        })
 
         csv_header = ['comment_id', 'comment_time', 'comment_user_id', 'comment_user_name',
-                      'comment_content', 'comment_likes', 'comment_crawler_time']
+                      'comment_content', 'comment_likes', 'comment_crawler_time', 'comment_root', 'comment_parent']
 
         return comments, csv_header
 
     @staticmethod
-    def parser_bullet(bullet_result):
+    def parser_bullet(bullet_result, crawl_time: str = None):
         """
         parse bullets
         :param bullet_result: bullet results from get_bullet()
-        :return: a list of structured results extracted from the json file, and a list of names as the csv header
-        """
-        bullets = []
-        for bullet in bullet_result:
-            bullet_detail = {
-                'bullet_content': bullet.text,  # bullet content
-                'bullet_entry': str.split(bullet.attrs['p'], ',')[0],  # the seconds when the bullet enter the video
-                'bullet_time': time.strftime("%Y-%m-%d %H:%M:%S",
-                                             time.localtime(int(str.split(bullet.attrs['p'], ',')[4]))),  # bullet post time
-                'bullet_crawler_time': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-            }
-            bullets.append(bullet_detail)
-
-        csv_header = ['bullet_content', 'bullet_entry', 'bullet_time', 'bullet_crawler_time']
+        :param crawl_time: the time the page was fetched, default to now
+        :return: a ColumnBatch of structured results extracted from the xml file, and a list of names as the csv header
+        """
+        crawl_time = crawl_time or time.strftime(TIME_FORMAT, time.localtime())
+        attrs = [bullet.attrs['p'].split(',') for bullet in bullet_result]
+        bullets = ColumnBatch({
+            'bullet_content': [bullet.text for bullet in bullet_result],  # bullet content
+            'bullet_entry': np.array([attr[0] for attr in attrs],
+                                     dtype=np.float64),  # the seconds when the bullet enter the video
+            'bullet_time': local_datetime([attr[4] for attr in attrs]),  # bullet post time
+            'bullet_crawler_time': repeat(crawl_time, len(bullet_result)),
+            'bullet_id': np.array([attr[7] for attr in attrs], dtype=np.int64),  # bullet id
+            'bullet_user': DictColumn.encode([attr[6] for attr in attrs])  # hash of the user id
+        })
+
+        csv_header = ['bullet_content', 'bullet_entry', 'bullet_time', 'bullet_crawler_time', 'bullet_id',
+                      'bullet_user']
+
+        return bullets, csv_header
+
+    @staticmethod
+    def parser_bullet_segments(bullet_segments, crawl_time: str = None):
+        """
+        parse bullets from protobuf segments, deduplicated by bullet id
+        :param bullet_segments: bullet segments from get_bullet_segments()
+        :param crawl_time: the time the segments were fetched, default to now
+        :return: a ColumnBatch with the same columns as parser_bullet(), and a list of names as the csv header
+        """
+        crawl_time = crawl_time or time.strftime(TIME_FORMAT, time.localtime())
+        unique = {}
+        for segment in bullet_segments:
+            for bullet in segment:
+                unique.setdefault(bullet[0], bullet)
+        ids, entries, post_times, contents, users = zip(*unique.values()) if unique else ((), (), (), (), ())
+        bullets = ColumnBatch({
+            'bullet_content': list(contents),  # bullet content
+            'bullet_entry': np.array(entries, dtype=np.float64) / 1000,  # the seconds when the bullet enter the video
+            'bullet_time': local_datetime(post_times),  # bullet post time
+            'bullet_crawler_time': repeat(crawl_time, len(ids)),
+            'bullet_id': np.array(ids, dtype=np.int64),  # bullet id
+            'bullet_user': DictColumn.encode(users)  # hash of the user id
+        })
+
+        csv_header = ['bullet_content', 'bullet_entry', 'bullet_time', 'bullet_crawler_time', 'bullet_id',
+                      'bullet_user']
 
         return bullets, csv_header
 
 
 class BilibiliCrawler(BaseBilibili):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, archive_dir: str = None, cache_dir: str = None, cache_ttl: dict = None):
+        super().__init__(archive_dir, cache_dir, cache_ttl)
         self.name = 'Bilibili Crawler'
         self.parser = BilibiliParser()
 
-    def crawl_channel(self, channel_url, output_path: str = None):
+    def crawl_channel(self, channel_url, output_path: str = None, as_frame: bool = True):
         """
         crawl all videos from a bilibili channel (uploaded in recent seven days)
         :param channel_url: the url of the channel
         :param output_path: path to save the result, default to None
+        :param as_frame: return a pandas.DataFrame if True, else a ColumnBatch (without importing pandas)
         :return: if no output path, return a pandas.DataFrame; else, also return a csv file saved in the output path
         """
-        pages = self.get_channel(channel_url)['numPages']
+        channel_json = self.get_channel(channel_url)
+        pages = channel_json['numPages']
 
         all_videos = []
         for page in range(1, pages):
-            time.sleep(1)
-            channel_json = self.get_channel(channel_url, page=page)
+            if page > 1:  # the first page was fetched for the number of pages
+                time.sleep(1)
+                channel_json = self.get_channel(channel_url, page=page)
             videos, csv_header = self.parser.parser_channel(channel_json)
             all_videos.append(videos)
 
@@ -302,14 +468,15 @@ class BilibiliCrawler(BaseBilibili):
             else:
                 print(f'Successfully get result from channel: {channel_url}, page: {page}')
 
-        all_videos_df = pd.DataFrame(all_videos)
-        return all_videos_df
+        all_videos = ColumnBatch.concat(all_videos)
+        return all_videos.to_frame() if as_frame else all_videos
 
-    def crawl_video(self, bvid_list: list, output_path: str = None):
+    def crawl_video(self, bvid_list: list, output_path: str = None, as_frame: bool = True):
         """
         crawl video details and uploader information from video(s)
         :param bvid_list: a list of bvid of video(s). Note that one bvid should also be in a list.
         :param output_path: path to save the result, default to None
+        :param as_frame: return a pandas.DataFrame if True, else a ColumnBatch (without importing pandas)
         :return: if no output path, return a pandas.DataFrame; else, also return a csv file saved in the output path
         """
         video_details = []
@@ -325,67 +492,150 @@ class BilibiliCrawler(BaseBilibili):
             else:
                 print(f'Successfully get result from video: {bvid}')
 
-        video_details_df = pd.DataFrame(video_details)
-        return video_details_df
+        video_details = ColumnBatch.concat(video_details)
+        return video_details.to_frame() if as_frame else video_details
 
-    def crawl_comment(self, bvid_list: list, output_path: str = None):
+    def crawl_comment(self, bvid_list: list, output_path: str = None, as_frame: bool = True,
+                      replies: bool = False, threads: int = 4, interval: float = 0.5):
         """
         crawl all comments from video(s)
         :param bvid_list: a list of bvid of video(s). Note that one bvid should also be in a list.
         :param output_path: path to save the result, default to None
+        :param as_frame: return a pandas.DataFrame if True, else a ColumnBatch (without importing pandas)
+        :param replies: also crawl the replies of each comment (linked by comment_root / comment_parent)
+        :param threads: number of threads to crawl replies
+        :param interval: seconds between two requests, shared by comment pages and replies
         :return: if no output path, return a pandas.DataFrame; else, also return a csv file saved in the output path
         """
 
-        comment_all = []
-        for bvid in bvid_list:
-            counts = self.get_comment(bvid)['data']['cursor']
-
-            if 'all_count' in counts.keys():
-                pages = counts['all_count'] // 20 + 1
-                print(f"A total of {pages} pages of comments in video {bvid}")  # the pages may be larger than actual pages
-
-                for page in range(pages):
-                    time.sleep(0.5)
-                    comment_json = self.get_comment(bvid, page)
-
-                    comment_result = comment_json['data']['replies']
-                    if comment_result:
-                        comments, csv_header = self.parser.parser_comment(comment_result)
-                        comments = [dict(**{'bvid': bvid}, **item) for item in comments]
-                        csv_header.insert(0, 'bvid')
-                        comment_all.append(comments)
-                        if output_path:
-                            self.save_data(comments, output_path, csv_header)
-                            print(f'Successfully save comment page {page + 1} to {output_path} from video: {bvid}')
-                        else:
-                            print(f'Successfully get comment page {page + 1} from video: {bvid}')
-                    else:
-                        print(f'all comments were crawled from video {bvid}')
-                        break
+        limiter = RateLimiter(interval)
+        comment_all, threads_running = [], []
 
+        def save_comments(comments, csv_header, message):
+            comment_all.append(comments)
+            if output_path:
+                self.save_data(comments, output_path, csv_header)
+                print(f'Successfully save {message} to {output_path}')
             else:
-                print(f'There is no comment of video {bvid}')
-                pass
+                print(f'Successfully get {message}')
+
+        def save_replies(wait: bool = False):
+            # save the reply threads crawled so far (or all of them), from the main thread only
+            for bvid, root, future in list(threads_running):
+                if wait or future.done():
+                    threads_running.remove((bvid, root, future))
+                    reply_result = future.result()
+                    if len(reply_result):
+                        save_comments(reply_result, reply_result.header,
+                                      f'{len(reply_result)} replies of comment {root} from video: {bvid}')
+
+        with ThreadPoolExecutor(threads) as pool:
+            for bvid in bvid_list:
+                # every request of the video goes through the limiter: the avid lookup, comment pages and replies
+                limiter.wait()
+                avid = self._get_avid(bvid)
+                limiter.wait()
+                comment_json = self.get_comment(bvid, avid=avid)
+                counts = comment_json['data']['cursor']
+
+                if 'all_count' in counts.keys():
+                    pages = counts['all_count'] // 20 + 1
+                    # the pages may be larger than actual pages
+                    print(f"A total of {pages} pages of comments in video {bvid}")
+
+                    for page in range(pages):
+                        if page:  # the first page was fetched for the number of comments
+                            limiter.wait()
+                            comment_json = self.get_comment(bvid, page, avid)
+
+                        comment_result = comment_json['data']['replies']
+                        if comment_result:
+                            comments, csv_header = self.parser.parser_comment(comment_result)
+                            comments.insert(0, 'bvid', bvid)
+                            csv_header.insert(0, 'bvid')
+                            save_comments(comments, csv_header, f'comment page {page + 1} from video: {bvid}')
+                        else:
+                            print(f'all comments were crawled from video {bvid}')
+                            break
+
+                        if replies:
+                            # threads with more replies than the inline previews are crawled by the thread pool
+                            previews = []
+                            for comment in comment_result:
+                                if comment.get('rcount', 0) > len(comment.get('replies') or []):
+                                    threads_running.append((bvid, comment['rpid'], pool.submit(
+                                        self._crawl_replies, bvid, avid, comment['rpid'], limiter)))
+                                else:
+                                    previews += comment.get('replies') or []
+                            if previews:
+                                preview_result, csv_header = self.parser.parser_comment(previews)
+                                preview_result.insert(0, 'bvid', bvid)
+                                csv_header.insert(0, 'bvid')
+                                save_comments(preview_result, csv_header,
+                                              f'replies of comment page {page + 1} from video: {bvid}')
+                            save_replies()
+
+                else:
+                    print(f'There is no comment of video {bvid}')
+                    pass
 
-        comment_all_df = pd.DataFrame(comment_all)
-        return comment_all_df
+            save_replies(wait=True)
 
-    def crawl_bullet(self, bvid_list: list, output_path: str = None):
+        comment_all = ColumnBatch.concat(comment_all)
+        return comment_all.to_frame() if as_frame else comment_all
+
+    def _crawl_replies(self, bvid: str, avid: int, root: int, limiter: RateLimiter):
+        """
+        crawl all replies of a comment. run in the thread pool of crawl_comment()
+        :param bvid: the bvid of the video
+        :param avid: the avid of the video
+        :param root: the comment id of the thread
+        :param limiter: the rate limiter shared with the comment pages
+        :return: a ColumnBatch of replies
+        """
+        reply_all, page = [], 1
+        while True:
+            limiter.wait()
+            reply_data = self.get_reply(avid, root, page, bvid).get('data') or {}
+            reply_result = reply_data.get('replies')
+            if not reply_result:
+                break
+            reply_batch, _ = self.parser.parser_comment(reply_result)
+            reply_all.append(reply_batch.insert(0, 'bvid', bvid))
+            if page * reply_data['page']['size'] >= reply_data['page']['count']:
+                break
+            page += 1
+        return ColumnBatch.concat(reply_all)
+
+    def crawl_bullet(self, bvid_list: list, output_path: str = None, as_frame: bool = True,
+                     source: str = 'segment', threads: int = 4):
         """
         crawl all bullets from video(s)
         :param bvid_list: a list of bvid of video(s). Note that one bvid should also be in a list.
         :param output_path: path to save the result, default to None
+        :param as_frame: return a pandas.DataFrame if True, else a ColumnBatch (without importing pandas)
+        :param source: 'segment' for the protobuf segments (all bullets, falls back to xml on errors),
+                       'xml' for the legacy xml (a capped sample of bullets)
+        :param threads: number of threads to download the segments of a video
         :return: if no output path, return a pandas.DataFrame; else, also return a csv file saved in the output path
         """
 
         bullet_all = []
         for bvid in bvid_list:
             time.sleep(1)
-            bullet_result = self.get_bullet(bvid)
-            if len(bullet_result) != 0:
-                print(f'A total of {len(bullet_result)} bullets in video {bvid}')
-                bullets, csv_header = self.parser.parser_bullet(bullet_result)
-                bullets = [dict(**{'bvid': bvid}, **item) for item in bullets]
+            bullets = None
+            video_json, _ = self.get_video(bvid, archive=False)  # cid and duration of the video
+            if source == 'segment':
+                try:
+                    bullets, csv_header = self.parser.parser_bullet_segments(
+                        self.get_bullet_segments(bvid, threads, video_json))
+                except (ValueError, requests.RequestException) as e:
+                    print(f'Failed to get bullet segments from video {bvid} ({e}), fall back to xml')
+            if bullets is None:
+                bullets, csv_header = self.parser.parser_bullet(self.get_bullet(bvid, video_json['cid']))
+            if len(bullets) != 0:
+                print(f'A total of {len(bullets)} bullets in video {bvid}')
+                bullets.insert(0, 'bvid', bvid)
                 csv_header.insert(0, 'bvid')
                 bullet_all.append(bullets)
                 if output_path:
@@ -397,8 +647,10 @@ class BilibiliCrawler(BaseBilibili):
                 print(f'There is no bullet of video {bvid}')
                 pass
 
-        bullet_all_df = pd.DataFrame(bullet_all)
-        return bullet_all_df
+        if self.cache:
+            print(self.cache.report())
+        bullet_all = ColumnBatch.concat(bullet_all)
+        return bullet_all.to_frame() if as_frame else bullet_all
 
 
 if __name__ == '__main__':
@@ -410,6 +662,7 @@ if __name__ == '__main__':
     channel_results = crawler.crawl_channel(my_channel_url, my_channel_output)
 
     # get video details
+    import pandas as pd
     my_bvid = pd.read_csv(my_channel_output)['bvid']
     # my_bvid = ['BV16X4y1g7wT']  # one video bvid should also in a list
     my_video_output = r'Bilibili/result_BilibiliVideoDetails.csv'
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+indexes and paginated queries over the sqlite database of XimalayaFMCrawler(db_path=...), e.g.
+    query = XimalayaQuery('XimalayaFM/data/ximalaya.db')
+    albums, cursor = query.top_albums('有声书', '文学')
+    for tracks in query.pages(query.album_tracks, album_id=3475911):
+        ...
+pages use keyset pagination: a page continues after the sort key of the last row (the cursor),
+so the 1000th page of top_albums() / album_tracks() is as fast as the first one on tens of millions of tracks.
+search() by rank is the exception: sqlite scores every match for each page, so a page costs time in the number of
+matches. search(order='id') pages through the matches by id without ranking them, e.g. to export all of them.
+"""
+
+import sqlite3
+
+from webcrawler.columnar import ColumnBatch
+
+# secondary indexes. album_id / track_id are the rowid, so an index on album_id is also ordered by track_id
+INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_album_basic_category ON album_basic (category, subcategory)',
+    'CREATE INDEX IF NOT EXISTS idx_album_detail_author ON album_detail (author_id)',
+    'CREATE INDEX IF NOT EXISTS idx_album_detail_plays ON album_detail (album_plays)',
+    'CREATE INDEX IF NOT EXISTS idx_album_track_album ON album_track (album_id)',
+    'CREATE INDEX IF NOT EXISTS idx_album_track_create ON album_track (track_create)',
+]
+
+# fts5 full-text indexes, {index: (table, rowid column, indexed columns)}.
+# the trigram tokenizer matches any substring of 3+ characters, as chinese text has no spaces between words
+FTS = {
+    'album_fts': ('album_detail', 'album_id', ['album_title', 'album_info', 'album_tags']),
+    'track_fts': ('album_track', 'track_id', ['track_name']),
+}
+
+# search targets, {target: (fts index, columns to return)}
+SEARCH = {
+    'album': ('album_fts', ['album_id', 'album_title', 'album_tags', 'album_plays', 'author_id', 'author_name']),
+    'track': ('track_fts', ['album_id', 'track_id', 'track_name', 'track_plays', 'track_create']),
+}
+
+
+def create_indexes(conn: sqlite3.Connection):
+    """
+    create the secondary indexes and the full-text indexes if they do not exist. full-text indexes are kept up to date
+    by triggers on their tables, and built from the existing rows when they are created
+    :param conn: a connection to the database, after the tables are created
+    """
+    for sql in INDEXES:
+        conn.execute(sql)
+    for fts, (table, rowid, columns) in FTS.items():
+        if conn.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (fts,)).fetchone():
+            continue
+        names = ', '.join(columns)
+        new = ', '.join(f'new.{column}' for column in columns)
+        old = ', '.join(f'old.{column}' for column in columns)
+        try:
+            conn.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, content='{table}', "
+                         f"content_rowid='{rowid}', tokenize='trigram')")
+        except sqlite3.OperationalError as e:
+            print(f'WARNING: full-text search is not available in sqlite {sqlite3.sqlite_version}: {e}')
+            break
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN '
+                     f'INSERT INTO {fts} (rowid, {names}) VALUES (new.{rowid}, {new}); END')
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN '
+                     f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.{rowid}, {old}); END")
+        conn.execute(f'CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE ON {table} BEGIN '
+                     f"INSERT INTO {fts} ({fts}, rowid, {names}) VALUES ('delete', old.{rowid}, {old}); "
+                     f'INSERT INTO {fts} (rowid, {names}) VALUES (new.{rowid}, {new}); END')
+        conn.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+    conn.commit()
+
+
+class XimalayaQuery:
+    """
+    paginated queries over the XimalayaFM database. each accessor returns a page as a ColumnBatch,
+    and the cursor of the next page (None after the last page); pages() streams all pages of an accessor
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        create_indexes(self.conn)
+        # full-text indexes created, none if sqlite has no fts5 trigram tokenizer
+        self.fts = {name for (name,) in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+                    if name in FTS}
+
+    def close(self):
+        self.conn.close()
+
+    @staticmethod
+    def pages(accessor, *args, **kwargs):
+        """
+        stream all pages of an accessor, e.g. pages(query.search, '三体全集', target='track')
+        :return: an iterator of ColumnBatch
+        """
+        cursor = None
+        while True:
+            batch, cursor = accessor(*args, cursor=cursor, **kwargs)
+            if len(batch):
+                yield batch
+            if cursor is None:
+                return
+
+    def top_albums(self, category: str, subcategory: str = None, page_size: int = 50, cursor: tuple = None):
+        """
+        albums of a category with the most plays
+        :param category: category name, e.g. 有声书
+        :param subcategory: subcategory name, e.g. 文学. default to all subcategories
+        :param page_size: rows of a page
+        :param cursor: the cursor returned with the previous page, None for the first page
+        :return: a ColumnBatch of albums, and the cursor of the next page
+        """
+        where, params = ['b.category = ?'], [category]
+        if subcategory:
+            where.append('b.subcategory = ?')
+            params.append(subcategory)
+        if cursor:
+            where.append('(d.album_plays < ? OR (d.album_plays = ? AND d.album_id < ?))')
+            params += [cursor[0], cursor[0], cursor[1]]
+        sql = f"""
+            SELECT d.album_id, d.album_title, b.category, b.subcategory, d.album_plays, d.album_subscribes,
+                   d.album_tracks, d.author_id, d.author_name
+            FROM album_basic b JOIN album_detail d ON d.album_id = b.album_id
+            WHERE {' AND '.join(where)}
+            ORDER BY d.album_plays DESC, d.album_id DESC LIMIT ?
+        """
+        return self._page(sql, params, page_size, key=lambda row: (row[4], row[0]))
+
+    def album_tracks(self, album_id: int, page_size: int = 500, cursor: tuple = None):
+        """
+        tracks of an album, by track id
+        :param album_id: album id
+        :param page_size: rows of a page
+        :param cursor: the cursor returned with the previous page, None for the first page
+        :return: a ColumnBatch of tracks, and the cursor of the next page
+        """
+        sql = 'SELECT * FROM album_track WHERE album_id = ? AND track_id > ? ORDER BY track_id LIMIT ?'
+        return self._page(sql, [album_id, cursor[0] if cursor else -1], page_size, key=lambda row: (row[1],))
+
+    def search(self, text: str, target: str = 'album', page_size: int = 50, cursor: tuple = None, order: str = 'rank'):
+        """
+        full-text search of albums (title, info and tags) or tracks (name).
+        all words separated by spaces must match; words shorter than 3 characters can not use the
+        trigram index (nor can any word without the full-text index), so they are matched by scanning the table,
+        in the order of ids
+        :param text: words to search, e.g. 三体 刘慈欣
+        :param target: 'album' or 'track'
+        :param page_size: rows of a page
+        :param cursor: the cursor returned with the previous page, None for the first page
+        :param order: 'rank' for the best matches first (every match is scored for each page),
+                      'id' for the order of ids (pages as fast as the first one)
+        :return: a ColumnBatch of albums or tracks with a rank column (lower is better), and the cursor of the next page
+        """
+        if target not in SEARCH:
+            raise ValueError(f'ERROR: target {target} can not be searched! Please use one of {list(SEARCH)}')
+        if order not in ['rank', 'id']:
+            raise ValueError(f"ERROR: order {order} is not supported! Please use 'rank' or 'id'")
+        fts, columns = SEARCH[target]
+        table, rowid, indexed = FTS[fts]
+        words = text.split()
+        if not words:
+            raise ValueError('ERROR: please give words to search')
+        selected = ', '.join(f't.{column}' for column in columns)
+        if fts in self.fts and min(len(word) for word in words) >= 3:
+            where = f'{fts} MATCH ?'
+            params = [' '.join('"' + word.replace('"', '""') + '"' for word in words)]
+            if order == 'id':
+                where += ' AND f.rowid > ?'
+                params.append(cursor[1] if cursor else -1)
+            elif cursor:
+                where += ' AND (f.rank > ? OR (f.rank = ? AND f.rowid > ?))'
+                params += [cursor[0], cursor[0], cursor[1]]
+            sql = f"""
+                SELECT {selected}, f.rank AS rank
+                FROM {fts} f JOIN {table} t ON t.{rowid} = f.rowid
+                WHERE {where} ORDER BY {'f.rowid' if order == 'id' else 'f.rank, f.rowid'} LIMIT ?
+            """
+        else:
+            document = " || ' ' || ".join(f"IFNULL(t.{column}, '')" for column in indexed)
+            where = [f"{document} LIKE ? ESCAPE '\\'"] * len(words) + [f't.{rowid} > ?']
+            params = ['%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                      for word in words] + [cursor[1] if cursor else -1]
+            sql = f"""
+                SELECT {selected}, 0.0 AS rank
+                FROM {table} t WHERE {' AND '.join(where)} ORDER BY t.{rowid} LIMIT ?
+            """
+        position = columns.index(rowid)
+        return self._page(sql, params, page_size, key=lambda row: (row[-1], row[position]))
+
+    def _page(self, sql: str, params: list, page_size: int, key):
+        cur = self.conn.execute(sql, params + [page_size])
+        rows = cur.fetchall()
+        batch = ColumnBatch.from_rows(rows, [column[0] for column in cur.description])
+        return batch, key(rows[-1]) if len(rows) == page_size else None
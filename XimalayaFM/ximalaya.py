@@ -5,19 +5,34 @@
 import json
 import sqlite3
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import pandas as pd
+import numpy as np
 import requests
 
+from webcrawler.adaptive import run_jobs
+from webcrawler.archive import RawArchive
+from webcrawler.columnar import ColumnBatch, format_epoch, local_datetime, repeat
+from webcrawler.http_cache import HttpCache, http_get
+from XimalayaFM.query import create_indexes
+
 
 class XimalayaFMCrawler:
-    def __init__(self, db_path=None, download_dir=None):
+    # cache ttl (seconds) of endpoints sending no cache headers, {url regex: seconds}
+    cache_ttl = {
+        r'/page/category/queryCategories': 24 * 3600,  # category list
+        r'/revision/user/basic\?': 24 * 3600,  # author profile
+        r'/page/anchor/queryAnchorPage/': 24 * 3600,  # author verification
+        r'/revision/bdsp/album/pay/schema\?': 3600  # album price
+    }
+
+    def __init__(self, db_path=None, download_dir=None, archive_dir=None, cache_dir=None, cache_ttl=None):
         self.name = 'XimalayaFM Crawler'
         self.headers = {'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
                                       '(KHTML, like Gecko) Chrome/100.0.4896.60 Safari/537.36'}
         self.db_path = db_path
         self.download_dir = download_dir
+        self.archive = RawArchive(archive_dir) if archive_dir else None  # raw responses, for re-parsing
+        self.cache = HttpCache(cache_dir, ttl=cache_ttl or self.cache_ttl) if cache_dir else None
 
     def get_category(self, category: str, subcategory: str = None, page: int = 1, filters: dict = None,
                      get_total_pages: bool = False):
@@ -41,31 +56,42 @@ class XimalayaFMCrawler:
             # some categories have no filters
             del params['meta']
 
-        category_json = json.loads(requests.get(cate_url, headers=self.headers, params=params).text)
+        response = requests.get(cate_url, headers=self.headers, params=params)
+        category_json = self._parse_json(response)
+        if self.archive and not get_total_pages:  # the page is archived again when it is crawled
+            self.archive.append(response.url, response.content, kind='category', key=f'{category}/{subcategory or ""}')
 
         total_pages = category_json['data']['total'] // 50 + 1
         if get_total_pages:
             return total_pages if total_pages < 50 else 50
 
-        albums = []
-        for album in category_json['data']['albums']:
-            album_basic = {
-                'album_id': album['albumId'],
-                'album_paid': album['isPaid'],  # is paid. True = need paid or VIP, False = free
-                'album_finished': album['isFinished'],  # is finished. 0 = not available, 1 = serialized, 2 = finished
-                'album_vipType': album['vipType'],  # paid type. 0 = only paid, 1 = only VIP, 2 = VIP or paid
-                'category': category,
-                'subcategory': subcategory
-            }
-            albums.append(album_basic)
-            if self.db_path:
-                self._save2db([album_basic], table_name='album_basic', album_id=album['albumId'])
+        albums = self._parse_albums(category_json['data']['albums'], category, subcategory)
+        if self.db_path:
+            self._save2db(albums, table_name='album_basic', album_id=f'{category} {subcategory} page {page}')
         return albums
 
-    def get_album_detail(self, album_id):
+    @staticmethod
+    def _parse_albums(album_list: list, category: str, subcategory: str = None):
+        albums = ColumnBatch({
+            'album_id': np.array([album['albumId'] for album in album_list], dtype=np.int64),
+            # is paid. True = need paid or VIP, False = free
+            'album_paid': [album['isPaid'] for album in album_list],
+            # is finished. 0 = not available, 1 = serialized, 2 = finished
+            'album_finished': [album['isFinished'] for album in album_list],
+            # paid type. 0 = only paid, 1 = only VIP, 2 = VIP or paid
+            'album_vipType': [album['vipType'] for album in album_list],
+            'category': repeat(category, len(album_list)),
+            'subcategory': repeat(subcategory, len(album_list))
+        })
+        return albums
+
+    def get_album_detail(self, album_id, replace: bool = False):
+        """
+        :param replace: update the album in the database if it is already there, e.g. to refresh its counters
+        """
         album_url = f'https://mobile.ximalaya.com/mobile/v1/album/ts-{round(time.time() * 1000)}?albumId={album_id}'
         album = self._get_json(album_url)['data']['album']
-        details = [{
+        details = ColumnBatch.from_records([{
             **{'album_id': album_id,
                'album_title': album['title'],
                'album_subtitle': album.get('customSubTitle'),
@@ -74,7 +100,7 @@ class XimalayaFMCrawler:
                'album_cover': album['coverSmall'].split('!')[0],
                'album_score': album.get('score'),  # quality score (user evaluation, 0-5). not available for free albums
                'album_score_10': self._get_album_score(album['albumId']),  # popularity score (0-10). shown on the page
-               'album_create': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(album['createdAt'] / 1000)),
+               'album_create': format_epoch([album['createdAt']], unit='ms')[0],
                'album_tracks': album['tracks'],
                'album_plays': album['playTimes'],
                'album_comments': album.get('commentsCount'),
@@ -82,70 +108,133 @@ class XimalayaFMCrawler:
             **self._parse_album_price(album['albumId']),
             **self._parse_author(album['uid']),
             **self._parse_author_verify(album['uid'])
-        }]
+        }])
         if self.db_path:
-            self._save2db(details, table_name='album_detail', album_id=album_id)
+            self._save2db(details, table_name='album_detail', album_id=album_id, replace=replace)
         return details
 
     def get_album_track(self, album_id):
         album_url = f'https://mobile.ximalaya.com/mobile/v1/album/track/ts-{round(time.time() * 1000)}?' \
                     f'albumId={album_id}&pageSize=50&pageId='
-        track_json = self._get_json(album_url + '1')['data']
+        track_json = self._get_json(album_url + '1', kind='track', key=album_id)['data']
         track_details = []
         for page in range(1, track_json['maxPageId'] + 1):
-            tracks = self._get_json(album_url + str(page))['data']['list']
-            for track in tracks:
-                track_detail = {
-                    'album_id': album_id,
-                    'track_id': track['trackId'],
-                    'track_name': track['title'],
-                    'track_duration': track['duration'],
-                    'track_plays': track['playtimes'],
-                    'track_likes': track['likes'],
-                    'track_comments': track['comments'],
-                    'track_create': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(track['createdAt'] / 1000)),
-                    'track_audio': track['playUrl32'].replace(
-                        'http://aod.cos.tx.xmcdn.com/', 'https://audiopay.cos.tx.xmcdn.com/download/1.0.0/')
-                    # download url for free (trial) tracks. valid for about 3 hours.
-                }
-                track_details.append(track_detail)
-                if self.db_path:
-                    self._save2db([track_detail], table_name='album_track',
-                                  album_id=album_id, track_id=track['trackId'])
-        return track_details
+            if page > 1:  # the first page was fetched for the number of pages
+                track_json = self._get_json(album_url + str(page), kind='track', key=album_id)['data']
+            tracks = track_json['list']
+            track_detail = self._parse_tracks(tracks, album_id)
+            track_details.append(track_detail)
+            if self.db_path:
+                self._save2db(track_detail, table_name='album_track', album_id=album_id, track_id=f'page {page}')
+        return ColumnBatch.concat(track_details)
+
+    @staticmethod
+    def _parse_tracks(tracks: list, album_id):
+        track_detail = ColumnBatch({
+            'album_id': np.full(len(tracks), album_id, dtype=np.int64),
+            'track_id': np.array([track['trackId'] for track in tracks], dtype=np.int64),
+            'track_name': [track['title'] for track in tracks],
+            'track_duration': np.array([track['duration'] for track in tracks], dtype=np.int64),
+            'track_plays': np.array([track['playtimes'] for track in tracks], dtype=np.int64),
+            'track_likes': np.array([track['likes'] for track in tracks], dtype=np.int64),
+            'track_comments': np.array([track['comments'] for track in tracks], dtype=np.int64),
+            'track_create': local_datetime([track['createdAt'] for track in tracks], unit='ms'),
+            'track_audio': [track['playUrl32'].replace(
+                'http://aod.cos.tx.xmcdn.com/', 'https://audiopay.cos.tx.xmcdn.com/download/1.0.0/')
+                for track in tracks]
+            # download url for free (trial) tracks. valid for about 3 hours.
+        })
+        return track_detail
 
     def crawler_category(self, category: str, subcategories: list = None,
-                         filters: dict = None, pages: int = None, threads: int = 10):
+                         filters: dict = None, pages: int = None, threads=10, as_frame: bool = True):
+        """
+        :param threads: number of threads, or 'auto' / an AdaptivePool to tune the number of threads at runtime
+        """
         print(f' start to crawl albums from category {category} '.center(100, '='))
-        results = []
-        with ThreadPoolExecutor(threads) as t:
+
+        def jobs():
             for subcategory in subcategories:
-                max_pages = self.get_category(category=category, subcategory=subcategory,
-                                              filters=filters, get_total_pages=True)
+                try:
+                    max_pages = self.get_category(category=category, subcategory=subcategory,
+                                                  filters=filters, get_total_pages=True)
+                except (ValueError, KeyError, requests.RequestException) as e:
+                    print(f'failed to get the pages of {category} {subcategory}: {e!r}, pass!')
+                    continue
                 for page in range(1, pages + 1 if pages and pages <= max_pages else max_pages + 1):
                     # maximum 50 pages for each category
-                    results.append(t.submit(self.get_category, category=category, subcategory=subcategory,
-                                            filters=filters, page=page))
-                    total_results = as_completed(results)
-        return pd.DataFrame(sum([result.result() for result in total_results], []))
+                    yield {'category': category, 'subcategory': subcategory, 'filters': filters, 'page': page}
+
+        albums = []
+        for result in run_jobs(self.get_category, jobs(), threads):
+            # a failed page (e.g. throttled) is skipped, and counted by an AdaptivePool to back off
+            if result.exception():
+                print(f'failed to crawl a page of {category}: {result.exception()!r}, pass!')
+                continue
+            albums.append(result.result())
+        albums = ColumnBatch.concat(albums)
+        if self.cache:
+            print(self.cache.report())
+        return albums.to_frame() if as_frame else albums
 
     @staticmethod
-    def crawler_threading(func, album_id_list: list, threads: int = 10):
+    def crawler_threading(func, album_id_list: list, threads=10, as_frame: bool = True):
+        """
+        :param threads: number of threads, or 'auto' / an AdaptivePool to tune the number of threads at runtime
+        """
         print(f' start to run {func.__name__} '.center(100, '='))
+        jobs = ({'album_id': album_id} for album_id in album_id_list)
         results = []
-        with ThreadPoolExecutor(threads) as t:
-            for album_id in album_id_list:
-                results.append(t.submit(func, album_id=album_id))
-                total_results = as_completed(results)
-        return pd.DataFrame(sum([result.result() for result in total_results], []))
-
-    def _get_json(self, url: str):
-        response = requests.get(url, headers=self.headers)
-        return json.loads(response.text)
+        for result in run_jobs(func, jobs, threads):
+            # a failed album (e.g. throttled) is skipped, and counted by an AdaptivePool to back off
+            if result.exception():
+                print(f'failed to run {func.__name__}: {result.exception()!r}, pass!')
+                continue
+            results.append(result.result())
+        results = ColumnBatch.concat(results)
+        cache = getattr(getattr(func, '__self__', None), 'cache', None)  # of the crawler running func
+        if cache:
+            print(cache.report())
+        return results.to_frame() if as_frame else results
+
+    def _get_json(self, url: str, kind: str = 'json', key='', cached: bool = False):
+        """
+        :param cached: get the url through the http cache (if any). only for the endpoints of cache_ttl, other urls
+                       (e.g. albums and tracks with a ts-<ms> segment) can never hit the cache
+        """
+        cache = self.cache if cached else None
+        response = http_get(url, cache, headers=self.headers, validate=self._is_valid_json)
+        result = cache.parse(response, kind, lambda text: self._parse_json(response)) if cache \
+            else self._parse_json(response)
+        if self.archive and not getattr(response, 'from_cache', False):
+            self.archive.append(response.url, response.content, kind=kind, key=key)
+        return result
+
+    @classmethod
+    def _is_valid_json(cls, response):
+        """ if a response can be cached, i.e. not an api error which would be served again until the ttl runs out """
+        try:
+            cls._parse_json(response)
+            return True
+        except ValueError:
+            return False
 
-    def _get_categories_map(self):
+    @staticmethod
+    def _parse_json(response):
+        """
+        :return: the json of a response
+        :raise ValueError: if the request was throttled or refused (not 200), or answered with an error (no data)
+        """
+        if response.status_code != 200:
+            raise ValueError(f'ERROR: {response.status_code} from {response.url}: {response.text[:100]}')
+        result = json.loads(response.text)
+        if not isinstance(result, dict) or result.get('data') is None:
+            raise ValueError(f'ERROR: no data from {response.url}: {response.text[:100]}')
+        return result
+
+    def _get_categories_map(self, as_frame: bool = True):
         categories_url = 'https://m.ximalaya.com/m-revision/page/category/queryCategories'
-        categories = self._get_json(categories_url)['data']
+        categories = self._get_json(categories_url, cached=True)['data']
         category_list = []
         for item in categories:
             category_details = {
@@ -163,24 +252,24 @@ class XimalayaFMCrawler:
                 }
                 category_list.append({**category_details, **subcategory_details})
         # pd.DataFrame(category_list).to_csv(r'XimalayaFM/map_categories.csv', index=False, encoding='utf-8-sig')
-        return pd.DataFrame(category_list)
+        return ColumnBatch.from_records(category_list).to_frame() if as_frame else category_list
 
     def _format_category(self, category: str, subcategory: str = None):
-        categories = self._get_categories_map()
-        cate = categories[['category_name', 'category_code']]
-        if category.lower() not in cate.values:
+        categories = self._get_categories_map(as_frame=False)
+        # category (or subcategory) name or code -> code. codes are matched first
+        cate = {**{item['category_name']: item['category_code'] for item in categories},
+                **{item['category_code']: item['category_code'] for item in categories}}
+        if category.lower() not in cate:
             raise ValueError(f'ERROR: category {category} not exist! Please check!')
-        category_code = (category.lower() if cate.columns[cate.eq(category.lower()).any()][0] == 'category_code'
-                         else cate.loc[cate['category_name'] == category, 'category_code'].iloc[0])
+        category_code = cate[category.lower()]
         if not subcategory:
             return category_code, ''
-        _ = categories.loc[categories['category_code'] == category_code].reset_index(drop=True)
-        subcate = _[['subcategory_name', 'subcategory_code']]
-        if subcategory.lower() not in subcate.values:
+        subcategories = [item for item in categories if item['category_code'] == category_code]
+        subcate = {**{item['subcategory_name']: item['subcategory_code'] for item in subcategories},
+                   **{item['subcategory_code']: item['subcategory_code'] for item in subcategories}}
+        if subcategory.lower() not in subcate:
             raise ValueError(f'ERROR: subcategory {subcategory} not exist in category {category}! Please check!')
-        subcate_code = (
-            subcategory.lower() if subcate.columns[subcate.eq(subcategory.lower()).any()][0] == 'subcategory_code'
-            else subcate.loc[subcate['subcategory_name'] == subcategory, 'subcategory_code'].iloc[0])
+        subcate_code = subcate[subcategory.lower()]
         return category_code, subcate_code
 
     @staticmethod
@@ -201,7 +290,7 @@ class XimalayaFMCrawler:
 
     def _parse_album_price(self, album_id):
         price_url = f'https://www.ximalaya.com/revision/bdsp/album/pay/schema?id={album_id}&productType=1'
-        price = self._get_json(price_url)['data']['albumPrice']
+        price = self._get_json(price_url, cached=True)['data']['albumPrice']
 
         if price.get('retailAlbum'):
             album_price = price['retailAlbum']['unBroughtTotalAmount']
@@ -218,7 +307,7 @@ class XimalayaFMCrawler:
 
     def _parse_author(self, author_id):
         author_url = f'https://www.ximalaya.com/revision/user/basic?uid={author_id}'
-        author = self._get_json(author_url)['data']
+        author = self._get_json(author_url, cached=True)['data']
         return {
             'author_id': author['uid'],
             'author_name': author['nickName'],
@@ -236,7 +325,7 @@ class XimalayaFMCrawler:
 
     def _parse_author_verify(self, author_id):
         verify_url = f'https://m.ximalaya.com/m-revision/page/anchor/queryAnchorPage/{author_id}'
-        verify = self._get_json(verify_url)['data']['anchorInfo']['userInfo']
+        verify = self._get_json(verify_url, cached=True)['data']['anchorInfo']['userInfo']
         return {
             'author_verified': verify['verifyStatus'],  # is verified. 1 = not verified, 3 = verified
             'author_verified_type': verify['verifyType'],  # verified type. 1 = person, 2 = company
@@ -312,33 +401,54 @@ class XimalayaFMCrawler:
         """)
 
         cur.close()
+        create_indexes(conn)  # secondary and full-text indexes for XimalayaQuery
+        conn.close()
 
-    def _save2db(self, result: list, table_name, album_id='', track_id=''):
+    def _save2db(self, result: ColumnBatch, table_name, album_id='', track_id='', replace: bool = False):
+        """
+        :param replace: update rows already in the database (same primary key) instead of skipping them
+        """
         self._create_db()
         conn = sqlite3.connect(self.db_path, check_same_thread=False)
         cur = conn.cursor()
         try:
-            pd.DataFrame(result).to_sql(name=table_name, con=conn, if_exists='append', index=False)
+            insert = f'INTO {table_name} ({", ".join(result.header)}) VALUES ({", ".join("?" * len(result.header))})'
+            if replace:
+                # an upsert, not INSERT OR REPLACE: the update triggers keep the full-text indexes in sync
+                key = 'track_id' if table_name == 'album_track' else 'album_id'
+                updates = ', '.join(f'{column} = excluded.{column}' for column in result.header if column != key)
+                sql = f'INSERT {insert} ON CONFLICT ({key}) DO UPDATE SET {updates}'
+            else:
+                # rows already in the database (same primary key) are skipped, the rest of the batch is still saved
+                sql = f'INSERT OR IGNORE {insert}'
+            cur.executemany(sql, result.rows())
+            conn.commit()
+            if not replace and cur.rowcount < len(result):
+                print(f'{album_id} {track_id} {len(result) - cur.rowcount} results already exist in database, pass!')
             print(f'successfully save result {album_id} {track_id}')
-        except sqlite3.IntegrityError:
-            print(f'{album_id} {track_id} result already exist in database, pass!')
-            pass
         finally:
             cur.close()
             conn.close()
 
-    def downloader_track(self, urls: list, download_names: list, threads: int = 10):
+    def downloader_track(self, urls: list, download_names: list, threads=10):
+        """
+        :param threads: number of threads, or 'auto' / an AdaptivePool to tune the number of threads at runtime
+        """
         if len(urls) != len(download_names):
             raise ValueError('the list of urls and download_names must be of the same length')
         print(' start to download tracks '.center(100, '='))
-        with ThreadPoolExecutor(threads) as t:
-            for url, download_name in zip(urls, download_names):
-                t.submit(self._download_track, url=url, download_name=download_name)
+        jobs = ({'url': url, 'download_name': download_name} for url, download_name in zip(urls, download_names))
+        for result in run_jobs(self._download_track, jobs, threads):
+            if result.exception():
+                print(f'failed to download a track: {result.exception()!r}')
 
     def _download_track(self, url: str, download_name: str):
-        response = requests.get(url, headers=self.headers)
         if not self.download_dir:
             raise AttributeError('ERROR: please set download directory before downloading audios')
+        response = requests.get(url, headers=self.headers)
+        if response.status_code != 200:
+            # e.g. a 429 / 403 page when throttled, not an audio
+            raise ValueError(f'ERROR: failed to download track {download_name}: {response.status_code} {response.reason}')
         with open(f'{self.download_dir}/{download_name}.m4a', 'wb') as f:
             f.write(response.content)
             print(f'Successfully download track {download_name} to {self.download_dir}')
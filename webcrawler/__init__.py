@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+shared helpers for the crawlers in BaiduSearch, Bilibili and XimalayaFM.
+run the crawlers from the repository root (e.g. `python -m Bilibili.bilibili`) so that this package can be imported.
+"""
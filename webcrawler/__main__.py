@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+
+import sys
+
+from webcrawler.cli import main
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+a thread pool tuning its concurrency at runtime, instead of a hand-tuned number of threads, e.g.
+    pool = AdaptivePool(min_workers=2, max_workers=32)
+    for future in pool.run(crawler.get_album_detail, [{'album_id': album_id} for album_id in album_ids]):
+        ...
+    pool.concurrency, pool.history  # the chosen number of threads, and the measurements of each epoch
+the pool hill-climbs on successful jobs per second: each epoch it moves the concurrency one step, keeps the direction
+while throughput improves and reverses it when throughput drops (or only latency grows). the concurrency is halved
+when too many jobs fail, e.g. when the site starts throttling.
+"""
+
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+
+_DONE = object()
+
+
+class AdaptivePool:
+
+    def __init__(self, min_workers: int = 2, max_workers: int = 32, start: int = None, epoch: float = 2.0,
+                 step: int = 1, tolerance: float = 0.05, max_error_rate: float = 0.1):
+        """
+        :param min_workers: minimum concurrency
+        :param max_workers: maximum concurrency
+        :param start: concurrency of the first epoch, default to min_workers
+        :param epoch: minimum seconds between two adjustments. an epoch also waits for `concurrency` jobs to complete
+        :param step: threads added or removed by an adjustment
+        :param tolerance: relative change of throughput (or latency) below which it counts as unchanged
+        :param max_error_rate: share of failed jobs in an epoch above which the concurrency is halved
+        """
+        if not 1 <= min_workers <= max_workers:
+            raise ValueError('ERROR: please give 1 <= min_workers <= max_workers')
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.concurrency = min(max(start or min_workers, min_workers), max_workers)
+        self.epoch = epoch
+        self.step = step
+        self.tolerance = tolerance
+        self.max_error_rate = max_error_rate
+        self.history = []  # one dict of measurements per epoch
+        self._direction = 1
+        self._reset(time.monotonic())
+
+    def _reset(self, now: float):
+        self._epoch_start, self._completed, self._failed, self._latency = now, 0, 0, 0.0
+
+    def run(self, func, jobs):
+        """
+        run func(**job) for each job, keeping at most `concurrency` jobs running
+        :param func: the function to run
+        :param jobs: an iterable of keyword arguments of func, consumed as the jobs are started
+        :return: an iterator of futures, as they complete
+        """
+        jobs, pending = iter(jobs), {}  # future -> start time
+        with ThreadPoolExecutor(self.max_workers) as executor:
+            self._reset(time.monotonic())
+            job = None
+            while True:
+                while job is not _DONE and len(pending) < self.concurrency:
+                    job = next(jobs, _DONE)
+                    if job is not _DONE:
+                        pending[executor.submit(func, **job)] = time.monotonic()
+                if not pending:
+                    return
+                done, _ = wait(pending, timeout=self.epoch, return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                for future in done:
+                    self._completed += 1
+                    self._failed += future.exception() is not None
+                    self._latency += now - pending.pop(future)
+                    yield future
+                self._tune(now)
+
+    def _tune(self, now: float):
+        elapsed = now - self._epoch_start
+        if elapsed < self.epoch or self._completed < self.concurrency:
+            return
+        stats = {
+            'concurrency': self.concurrency,
+            'jobs_per_second': (self._completed - self._failed) / elapsed,  # successful jobs
+            'latency': self._latency / self._completed,
+            'error_rate': self._failed / self._completed,
+        }
+        previous = self.history[-1] if self.history else None
+        self.history.append(stats)
+        self._reset(now)
+
+        if stats['error_rate'] > self.max_error_rate:
+            self.concurrency = max(self.min_workers, self.concurrency // 2)
+            self._direction = 1
+            return
+        if previous:
+            if stats['jobs_per_second'] < previous['jobs_per_second'] * (1 - self.tolerance):
+                self._direction = -self._direction
+            elif stats['jobs_per_second'] <= previous['jobs_per_second'] * (1 + self.tolerance) \
+                    and stats['latency'] > previous['latency'] * (1 + self.tolerance):
+                self._direction = -1  # more threads only wait longer
+        concurrency = self.concurrency + self._direction * self.step
+        if not self.min_workers <= concurrency <= self.max_workers:
+            self._direction = -self._direction
+            concurrency = self.concurrency + self._direction * self.step
+        self.concurrency = min(max(concurrency, self.min_workers), self.max_workers)
+
+    def report(self):
+        best = max(self.history, key=lambda stats: stats['jobs_per_second'], default=None)
+        path = ' -> '.join(str(stats['concurrency']) for stats in self.history[-20:])
+        return f'adaptive pool: {self.concurrency} threads ({self.min_workers}-{self.max_workers}), ' \
+               f'last epochs {path or "none"}' + \
+               (f', best {best["jobs_per_second"]:.2f} jobs/s with {best["concurrency"]} threads' if best else '')
+
+
+def run_jobs(func, jobs, threads=10):
+    """
+    run func(**job) for each job in a thread pool
+    :param func: the function to run
+    :param jobs: an iterable of keyword arguments of func
+    :param threads: a number of threads, or 'auto' / an AdaptivePool to tune the number of threads at runtime
+    :return: an iterator of futures, as they complete
+    """
+    if threads == 'auto':
+        threads = AdaptivePool(start=10)  # from the former fixed default
+    if isinstance(threads, AdaptivePool):
+        yield from threads.run(func, jobs)
+        print(threads.report())
+    else:
+        with ThreadPoolExecutor(threads) as executor:
+            yield from as_completed([executor.submit(func, **job) for job in jobs])
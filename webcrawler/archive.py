@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+
+import os
+import sqlite3
+import threading
+import time
+
+
+class RawArchive:
+    """
+    an append-only archive of raw response bodies, so results can be re-parsed without crawling again.
+    each body is one zstd frame appended to a rolling segment file (segment-000000.zst, segment-000001.zst, ...),
+    and one row per body is added to the sqlite index (index.db): fetch_time, kind, key, segment, offset, length, url,
+    keyed by (url, fetch_time) for lookups and by kind for re-parsing, so neither scans the whole index.
+    one crawler process should write to an archive directory at a time (threads in the process are fine).
+    requires the optional package `zstandard` (pip install zstandard).
+    """
+    index_fields = ['fetch_time', 'kind', 'key', 'segment', 'offset', 'length', 'url']
+
+    def __init__(self, archive_dir: str, segment_size: int = 256 * 1024 * 1024, level: int = 3):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('ERROR: the raw archive needs zstandard, please run `pip install zstandard`')
+        self.archive_dir = archive_dir
+        self.segment_size = segment_size
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._decompressor = zstandard.ZstdDecompressor()
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_file = None
+        self._offset = 0
+        os.makedirs(archive_dir, exist_ok=True)
+
+        self._conn = sqlite3.connect(self._index_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')  # re-parsing can read while a crawler appends
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS body (
+            fetch_time REAL, /* epoch time */
+            kind TEXT,
+            key TEXT,
+            segment INTEGER,
+            frame_offset INTEGER, /* offset of the zstd frame in the segment file */
+            frame_length INTEGER,
+            url TEXT
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS body_url ON body (url, fetch_time)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS body_kind ON body (kind)')
+        self._conn.commit()
+
+    def append(self, url: str, body: bytes, kind: str, key=''):
+        """
+        append a response body to the archive
+        :param url: the requested url
+        :param body: the raw response body
+        :param kind: which parser the body belongs to, e.g. 'bullet'
+        :param key: the item the body belongs to, e.g. the bvid of a video
+        :return: None
+        """
+        frame = self._compressor.compress(body)
+        fetch_time = time.time()
+        with self._lock:
+            if self._segment_file is None or (self._offset and self._offset + len(frame) > self.segment_size):
+                self._roll()
+            self._segment_file.write(frame)
+            self._segment_file.flush()
+            self._conn.execute('INSERT INTO body VALUES (?, ?, ?, ?, ?, ?, ?)',
+                               (fetch_time, kind, str(key), self._segment, self._offset, len(frame), url))
+            self._conn.commit()
+            self._offset += len(frame)
+
+    def index(self, kind: str = None):
+        """
+        iterate the index of the archive in fetch order
+        :param kind: only return bodies of this kind. default to all
+        :return: an iterator of dicts with the index fields
+        """
+        # a connection of its own, so appends of other threads do not disturb the iteration
+        conn = sqlite3.connect(self._index_path)
+        try:
+            query = 'SELECT fetch_time, kind, key, segment, frame_offset, frame_length, url FROM body'
+            cursor = conn.execute(query + ' WHERE kind = ? ORDER BY rowid', (kind,)) if kind \
+                else conn.execute(query + ' ORDER BY rowid')
+            for row in cursor:
+                yield dict(zip(self.index_fields, row))
+        finally:
+            conn.close()
+
+    def records(self, kind: str = None):
+        """
+        stream archived bodies in fetch order. segments are read sequentially, one file handle at a time
+        :param kind: only return bodies of this kind. default to all
+        :return: an iterator of (index entry, body) tuples
+        """
+        segment, fp = None, None
+        try:
+            for entry in self.index(kind):
+                if entry['segment'] != segment:
+                    if fp:
+                        fp.close()
+                    segment = entry['segment']
+                    fp = open(self._segment_path(segment), 'rb')
+                fp.seek(entry['offset'])
+                yield entry, self._decompressor.decompress(fp.read(entry['length']))
+        finally:
+            if fp:
+                fp.close()
+
+    def lookup(self, url: str, fetch_time: float = None):
+        """
+        get the latest archived body of an url, through the (url, fetch_time) index
+        :param url: the requested url
+        :param fetch_time: only bodies fetched at or before this epoch time. default to the latest body
+        :return: the raw body, or None if the url is not archived
+        """
+        with self._lock:
+            latest = self._conn.execute(
+                'SELECT segment, frame_offset, frame_length FROM body WHERE url = ? AND fetch_time <= ? '
+                'ORDER BY fetch_time DESC LIMIT 1', (url, float('inf') if fetch_time is None else fetch_time)
+            ).fetchone()
+        if not latest:
+            return None
+        segment, offset, length = latest
+        with open(self._segment_path(segment), 'rb') as fp:
+            fp.seek(offset)
+            return self._decompressor.decompress(fp.read(length))
+
+    def close(self):
+        with self._lock:
+            if self._segment_file:
+                self._segment_file.close()
+                self._segment_file = None
+            self._conn.close()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.archive_dir, 'index.db')
+
+    def _segment_path(self, segment: int):
+        return os.path.join(self.archive_dir, f'segment-{segment:06d}.zst')
+
+    def _roll(self):
+        """ open the last segment when starting, or a new segment when the current one is full """
+        if self._segment_file is None:
+            segments = sorted(name for name in os.listdir(self.archive_dir) if name.startswith('segment-'))
+            self._segment = int(segments[-1][8:14]) if segments else 0
+        else:
+            self._segment_file.close()
+            self._segment += 1
+        self._segment_file = open(self._segment_path(self._segment), 'ab')
+        self._offset = self._segment_file.seek(0, os.SEEK_END)
+        if self._offset >= self.segment_size:
+            self._roll()
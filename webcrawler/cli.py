@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+command line entry point of the crawlers, e.g.
+    python -m webcrawler baidu search --words 健康 养生 --pages 3 --cookie "..." -o result.csv
+    python -m webcrawler bilibili bullet --bvid-file Bilibili/result_BilibiliChannelVideos.csv -o bullets.csv
+    python -m webcrawler ximalaya category --config job.json
+a --config json file holds the same options as the flags, e.g. {"category": "有声书", "subcategories": ["文学"]};
+flags given on the command line win over the config file.
+crawler modules (and their requests / numpy imports) are loaded only by the subcommand that needs them,
+and pandas / BeautifulSoup only on the code paths using them.
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import sys
+
+# defaults of options not given by a flag or a config file, per site.
+# bilibili leaves threads to crawl_comment / crawl_bullet (4 per video)
+DEFAULTS = {'baidu': {}, 'bilibili': {'budget': 600}, 'ximalaya': {'threads': 10, 'budget': 600}}
+
+
+def _read_column(path: str, column: str):
+    """ read one column of a csv result, e.g. the bvid of result_BilibiliChannelVideos.csv """
+    with open(path, newline='', encoding='utf-8-sig') as fp:
+        return [row[column] for row in csv.DictReader(fp) if row.get(column)]
+
+
+def _ids(args, name: str, column: str):
+    ids = list(getattr(args, name) or [])
+    if getattr(args, f'{name}_file'):
+        ids += _read_column(getattr(args, f'{name}_file'), column)
+    if not ids:
+        raise SystemExit(f'ERROR: please give --{name.replace("_", "-")} or --{name.replace("_", "-")}-file')
+    return ids
+
+
+def _threads(value: str):
+    """ a number of threads, or 'auto' to tune it at runtime """
+    return value if value == 'auto' else int(value)
+
+
+def _save(result, output_path: str):
+    if output_path:
+        from webcrawler.columnar import save_batch
+        save_batch(result, output_path, result.header)
+        print(f'Successfully save {len(result)} results to {output_path}')
+
+
+def baidu_search(args):
+    from BaiduSearch.baidu import BaiduCrawler
+    if not args.words:
+        raise SystemExit('ERROR: please give --words')
+    profiles = args.profiles
+    if isinstance(profiles, str):
+        with open(profiles, encoding='utf-8') as fp:
+            profiles = json.load(fp)
+    crawler = BaiduCrawler(cookie=args.cookie or '', archive_dir=args.archive_dir, profiles=profiles,
+                           interval=args.interval or 1.0)
+    crawler.search_news(words=args.words, pages=args.pages or 1, output_path=args.output, as_frame=False)
+
+
+def bilibili(args):
+    from Bilibili.bilibili import BilibiliCrawler
+    crawler = BilibiliCrawler(archive_dir=args.archive_dir, cache_dir=args.cache_dir)
+    if args.command == 'channel':
+        if not args.url:
+            raise SystemExit('ERROR: please give --url')
+        crawler.crawl_channel(args.url, args.output, as_frame=False)
+    else:
+        crawl = {'video': crawler.crawl_video, 'comment': crawler.crawl_comment, 'bullet': crawler.crawl_bullet}
+        options = ({'replies': args.replies, 'threads': args.threads} if args.command == 'comment' else
+                   {'source': args.source or 'segment', 'threads': args.threads} if args.command == 'bullet' else {})
+        options = {key: value for key, value in options.items() if value is not None}
+        crawl[args.command](_ids(args, 'bvid', 'bvid'), args.output, as_frame=False, **options)
+
+
+def ximalaya(args):
+    from XimalayaFM.ximalaya import XimalayaFMCrawler
+    crawler = XimalayaFMCrawler(db_path=args.db, download_dir=args.download_dir,
+                                archive_dir=args.archive_dir, cache_dir=args.cache_dir)
+    if args.command == 'category':
+        if not (args.category and args.subcategories):
+            raise SystemExit('ERROR: please give --category and --subcategories')
+        filters = dict(item.split('=', 1) for item in args.filters) if args.filters else None
+        _save(crawler.crawler_category(category=args.category, subcategories=args.subcategories, filters=filters,
+                                       pages=args.pages, threads=args.threads, as_frame=False), args.output)
+    elif args.command in ['detail', 'track']:
+        func = crawler.get_album_detail if args.command == 'detail' else crawler.get_album_track
+        album_ids = [int(album_id) for album_id in _ids(args, 'album_id', 'album_id')]
+        _save(crawler.crawler_threading(func, album_id_list=album_ids, threads=args.threads, as_frame=False),
+              args.output)
+    else:
+        if not (args.track_file and args.download_dir):
+            raise SystemExit('ERROR: please give --track-file and --download-dir')
+        crawler.downloader_track(urls=_read_column(args.track_file, 'track_audio'),
+                                 download_names=_read_column(args.track_file, 'track_id'), threads=args.threads)
+
+
+def refresh(args):
+    from webcrawler.refresh import RefreshScheduler
+    if not args.state:
+        raise SystemExit('ERROR: please give --state')
+    if args.site == 'bilibili':
+        from Bilibili.bilibili import BilibiliCrawler
+        crawler = BilibiliCrawler(archive_dir=args.archive_dir, cache_dir=args.cache_dir)
+        kind, name = 'video', 'bvid'
+
+        def fetch(bvid):
+            return crawler.crawl_video([bvid], args.output, as_frame=False)
+    else:
+        from XimalayaFM.ximalaya import XimalayaFMCrawler
+        crawler = XimalayaFMCrawler(db_path=args.db, archive_dir=args.archive_dir, cache_dir=args.cache_dir)
+        kind, name = 'album', 'album_id'
+
+        def fetch(album_id):
+            details = crawler.get_album_detail(int(album_id), replace=True)
+            _save(details, args.output)
+            return details
+
+    scheduler = RefreshScheduler(args.state, budget=args.budget)
+    if getattr(args, name) or getattr(args, f'{name}_file'):
+        scheduler.add(kind, _ids(args, name, name))
+    try:
+        for _ in scheduler.run({kind: fetch}, hours=args.hours):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(scheduler.report())
+        if crawler.cache:
+            print(crawler.cache.report())
+        scheduler.close()
+
+
+def ximalaya_search(args):
+    from XimalayaFM.query import XimalayaQuery
+    if not (args.db and args.text):
+        raise SystemExit('ERROR: please give --db and --text')
+    query = XimalayaQuery(args.db)
+    pages = query.pages(query.search, ' '.join(args.text), target=args.target or 'album', order=args.order or 'rank')
+    for page in itertools.islice(pages, args.pages):
+        if args.output:
+            _save(page, args.output)
+        else:
+            for row in page.rows():
+                print(*row, sep='\t')
+    query.close()
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--config', help='a json file of options, e.g. {"pages": 3}')
+    common.add_argument('-o', '--output', help='path to save the csv results')
+    common.add_argument('--archive-dir', help='directory to archive raw responses, for re-parsing')
+
+    cached = argparse.ArgumentParser(add_help=False)
+    cached.add_argument('--cache-dir', help='directory of the http cache')
+
+    refresher = argparse.ArgumentParser(add_help=False)
+    refresher.add_argument('--state', help='sqlite database of the refresh schedules, kept between runs')
+    refresher.add_argument('--budget', type=int, help='requests per hour, default to 600')
+    refresher.add_argument('--hours', type=float, help='stop after hours, default to run until interrupted')
+
+    parser = argparse.ArgumentParser(prog='webcrawler', description='Python Web Crawler')
+    sites = parser.add_subparsers(dest='site', required=True)
+
+    # baidu
+    baidu = sites.add_parser('baidu', help='Baidu Search').add_subparsers(dest='command', required=True)
+    search = baidu.add_parser('search', parents=[common], help='search Baidu news')
+    search.add_argument('--words', nargs='+', help='a list of words used to search')
+    search.add_argument('--pages', type=int, help='how many pages to crawl for each word, default to 1')
+    search.add_argument('--cookie', help='your cookie after login')
+    search.add_argument('--profiles', help='a json file of identities to spread the searches over, '
+                                           'e.g. [{"cookie": "...", "user_agent": "...", "interval": 2}]')
+    search.add_argument('--interval', type=float, help='seconds between two searches of an identity, default to 1')
+    search.set_defaults(func=baidu_search)
+
+    # bilibili
+    bili = sites.add_parser('bilibili', help='Bilibili').add_subparsers(dest='command', required=True)
+    channel = bili.add_parser('channel', parents=[common, cached], help='videos of a channel (recent seven days)')
+    channel.add_argument('--url', help='the url of a bilibili channel')
+    channel.set_defaults(func=bilibili)
+    for command, description in [('video', 'video details and uploader information'),
+                                 ('comment', 'comments of videos'), ('bullet', 'bullets of videos')]:
+        sub = bili.add_parser(command, parents=[common, cached], help=description)
+        sub.add_argument('--bvid', nargs='+', help='bvid of videos')
+        sub.add_argument('--bvid-file', help='a csv file with a bvid column, e.g. the channel result')
+        sub.set_defaults(func=bilibili)
+        if command == 'comment':
+            sub.add_argument('--replies', action='store_true', default=None, help='also crawl replies of comments')
+            sub.add_argument('--threads', type=int, help='number of threads to crawl replies')
+        if command == 'bullet':
+            sub.add_argument('--source', choices=['segment', 'xml'],
+                             help='protobuf segments (default, falls back to xml) or the legacy xml')
+            sub.add_argument('--threads', type=int, help='number of threads to download the segments of a video')
+    bili_refresh = bili.add_parser('refresh', parents=[common, cached, refresher],
+                                   help='refresh counters of videos, hot videos more often')
+    bili_refresh.add_argument('--bvid', nargs='+', help='bvid of videos to add to the schedules')
+    bili_refresh.add_argument('--bvid-file', help='a csv file with a bvid column, e.g. the channel result')
+    bili_refresh.set_defaults(func=refresh)
+
+    # ximalaya
+    xm = sites.add_parser('ximalaya', help='XimalayaFM').add_subparsers(dest='command', required=True)
+    ximalaya_common = argparse.ArgumentParser(add_help=False)
+    ximalaya_common.add_argument('--db', help='path of the sqlite database to save results')
+    ximalaya_common.add_argument('--download-dir', help='directory to save track audios')
+    ximalaya_common.add_argument('--threads', type=_threads,
+                                 help="number of threads, or 'auto' to tune it by the measured throughput")
+    category = xm.add_parser('category', parents=[common, cached, ximalaya_common], help='albums of a category')
+    category.add_argument('--category', help='category name or code, e.g. 有声书')
+    category.add_argument('--subcategories', nargs='+', help='subcategory names or codes, e.g. 文学 经典')
+    category.add_argument('--filters', nargs='+', help='filters, e.g. announcer=single paid=yes')
+    category.add_argument('--pages', type=int, help='pages of each subcategory, default to all')
+    category.set_defaults(func=ximalaya)
+    for command, description in [('detail', 'album details'), ('track', 'tracks of albums')]:
+        sub = xm.add_parser(command, parents=[common, cached, ximalaya_common], help=description)
+        sub.add_argument('--album-id', nargs='+', help='album ids')
+        sub.add_argument('--album-id-file', help='a csv file with an album_id column, e.g. the category result')
+        sub.set_defaults(func=ximalaya)
+    download = xm.add_parser('download', parents=[common, cached, ximalaya_common], help='download track audios')
+    download.add_argument('--track-file', help='a csv file with track_id and track_audio columns')
+    download.set_defaults(func=ximalaya)
+    xm_refresh = xm.add_parser('refresh', parents=[common, cached, ximalaya_common, refresher],
+                               help='refresh plays and subscribes of albums, hot albums more often')
+    xm_refresh.add_argument('--album-id', nargs='+', help='album ids to add to the schedules')
+    xm_refresh.add_argument('--album-id-file', help='a csv file with an album_id column, e.g. the category result')
+    xm_refresh.set_defaults(func=refresh)
+    search = xm.add_parser('search', parents=[common, ximalaya_common], help='full-text search of the database')
+    search.add_argument('--text', nargs='+', help='words to search, all of them must match')
+    search.add_argument('--target', choices=['album', 'track'], help='search albums (default) or tracks')
+    search.add_argument('--pages', type=int, help='pages of 50 results, default to all')
+    search.add_argument('--order', choices=['rank', 'id'],
+                        help='best matches first (rank, default), or by id: faster to page through many matches')
+    search.set_defaults(func=ximalaya_search)
+    return parser
+
+
+def main(argv: list = None):
+    args = build_parser().parse_args(argv)
+    config = {}
+    if args.config:
+        with open(args.config, encoding='utf-8') as fp:
+            config = json.load(fp)
+    for key, value in {**DEFAULTS[args.site], **config}.items():
+        key = key.replace('-', '_')
+        if getattr(args, key, None) is None:
+            setattr(args, key, value)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+
+import csv
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class DictColumn:
+    """
+    a dictionary-encoded column for repeated strings, e.g. bvid, category or crawl time.
+    each distinct value is stored once (interned), and each row is an int32 code into the values. None is code -1.
+    """
+    __slots__ = ('codes', 'values')
+
+    def __init__(self, codes, values: list):
+        self.codes = np.asarray(codes, dtype=np.int32)
+        self.values = [sys.intern(value) if type(value) is str else value for value in values]
+
+    @classmethod
+    def encode(cls, items: list):
+        index = {}
+        codes = np.fromiter((-1 if item is None else index.setdefault(item, len(index)) for item in items),
+                            dtype=np.int32, count=len(items))
+        return cls(codes, list(index))
+
+    @classmethod
+    def repeat(cls, value, n: int):
+        return cls(np.full(n, -1 if value is None else 0, dtype=np.int32), [] if value is None else [value])
+
+    @classmethod
+    def concat(cls, columns: list):
+        index, codes = {}, []
+        for column in columns:
+            # code -1 (None) takes the last item of the remap, which stays -1
+            remap = np.array([index.setdefault(value, len(index)) for value in column.values] + [-1], dtype=np.int32)
+            codes.append(remap[column.codes])
+        return cls(np.concatenate(codes), list(index))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def tolist(self):
+        values = self.values + [None]
+        return [values[code] for code in self.codes.tolist()]
+
+
+def repeat(value, n: int):
+    """ a column with the same value for every row, e.g. the crawl time of a batch """
+    return DictColumn.repeat(value, n)
+
+
+def _to_list(values):
+    """ convert a column to a list of python objects for the csv / sqlite outputs, datetimes as TIME_FORMAT """
+    if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+        strings = np.char.replace(np.datetime_as_string(values, unit='s'), 'T', ' ').tolist()
+        missing = np.isnat(values)
+        return [None if nat else string for string, nat in zip(strings, missing.tolist())] if missing.any() else strings
+    if isinstance(values, (np.ndarray, DictColumn)):
+        return values.tolist()
+    return values
+
+
+class ColumnBatch:
+    """
+    a batch of parsed results stored column by column, i.e. a dict of equal-length arrays.
+    parsers build one batch per page instead of one dict per row, and the csv / sqlite / pandas outputs
+    read the columns directly.
+    """
+
+    def __init__(self, columns: dict = None):
+        self.columns = dict(columns or {})
+        if len({len(values) for values in self.columns.values()}) > 1:
+            raise ValueError('ERROR: all columns of a batch must be of the same length')
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def header(self):
+        return list(self.columns)
+
+    def insert(self, position: int, name: str, value):
+        """
+        insert a column with the same value for every row, e.g. the bvid of a video or the search word
+        :param position: index of the new column
+        :param name: name of the new column
+        :param value: the value of each row
+        :return: the batch itself
+        """
+        items = list(self.columns.items())
+        items.insert(position, (name, repeat(value, len(self))))
+        self.columns = dict(items)
+        return self
+
+    def rows(self, header: list = None):
+        """
+        iterate the batch row by row as tuples of python objects (each column is converted in one pass)
+        :param header: names of the columns to output, in order. default to all columns
+        :return: an iterator of tuples
+        """
+        return zip(*[_to_list(self.columns[name]) for name in header or self.header])
+
+    def to_records(self):
+        header = self.header
+        return [dict(zip(header, row)) for row in self.rows(header)]
+
+    def to_frame(self):
+        """ a pandas.DataFrame sharing the numpy columns; dictionary-encoded columns become categoricals """
+        import pandas as pd
+        columns = {name: pd.Categorical.from_codes(values.codes, categories=values.values)
+                   if isinstance(values, DictColumn) else values for name, values in self.columns.items()}
+        return pd.DataFrame(columns, columns=self.header, copy=False)
+
+    @classmethod
+    def from_records(cls, records: list, header: list = None):
+        header = header or (list(records[0]) if records else [])
+        return cls({name: [record.get(name) for record in records] for name in header})
+
+    @classmethod
+    def from_rows(cls, rows: list, header: list):
+        """ a batch from row tuples, e.g. cursor.fetchall() of a sqlite query """
+        return cls({name: list(values) for name, values in itertools.zip_longest(header, zip(*rows), fillvalue=())})
+
+    @classmethod
+    def concat(cls, batches: list):
+        """
+        concatenate batches with the same columns into one batch
+        :param batches: a list of ColumnBatch
+        :return: a ColumnBatch
+        """
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls()
+        columns = {}
+        for name in batches[0].header:
+            values = [batch.columns[name] for batch in batches]
+            if all(isinstance(value, np.ndarray) for value in values):
+                columns[name] = np.concatenate(values)
+            elif all(isinstance(value, DictColumn) for value in values):
+                columns[name] = DictColumn.concat(values)
+            else:
+                columns[name] = list(itertools.chain.from_iterable(values))
+        return cls(columns)
+
+
+def local_datetime(epochs, unit: str = 's'):
+    """
+    convert epoch times to local datetimes in one vectorized pass (8 bytes per value),
+    written as TIME_FORMAT strings by the csv / sqlite outputs, same as time.localtime(epoch)
+    :param epochs: a sequence of epoch times, None for missing times (NaT)
+    :param unit: 's' for seconds, 'ms' for milliseconds
+    :return: a numpy datetime64[s] array
+    """
+    values = np.asarray(epochs)
+    missing = np.equal(values, None) if values.dtype == object else None
+    seconds = np.where(missing, 0, values).astype(np.int64) if missing is not None else values.astype(np.int64)
+    if unit == 'ms':
+        seconds = seconds // 1000
+    if seconds.size == 0:
+        return seconds.astype('datetime64[s]')
+    # the utc offset (daylight saving time) only changes on a quarter hour, so look it up once per distinct quarter
+    quarters, inverse = np.unique(seconds // 900, return_inverse=True)
+    offsets = np.array([time.localtime(quarter * 900).tm_gmtoff for quarter in quarters.tolist()], dtype=np.int64)
+    datetimes = (seconds + offsets[inverse.reshape(-1)]).astype('datetime64[s]')
+    if missing is not None:
+        datetimes[missing] = np.datetime64('NaT')
+    return datetimes
+
+
+def format_epoch(epochs, unit: str = 's'):
+    """
+    convert epoch times to local "%Y-%m-%d %H:%M:%S" strings in one vectorized pass,
+    same result as time.strftime(TIME_FORMAT, time.localtime(epoch)) for each value
+    :param epochs: a sequence of epoch times
+    :param unit: 's' for seconds, 'ms' for milliseconds
+    :return: a numpy array of strings
+    """
+    return np.char.replace(np.datetime_as_string(local_datetime(epochs, unit), unit='s'), 'T', ' ')
+
+
+def save_batch(batch, output_path: str = None, csv_header: list = None):
+    """
+    to save a batch (or a list of dicts) in a csv file. the header is written only for a new file.
+    an existing file with another header (e.g. written before columns were added) is moved aside first, see rotate_csv()
+    :param batch: a ColumnBatch, or a list of dicts
+    :param output_path: path to save the csv file
+    :param csv_header: headers of the csv
+    :return: None. (a csv file saved in the output path)
+    """
+    if output_path:
+        rotate_csv(output_path, csv_header)
+        with open(output_path, 'a', newline='', encoding='utf-8-sig') as fp:
+            if isinstance(batch, ColumnBatch):
+                csv_writer = csv.writer(fp)
+                if fp.tell() == 0:
+                    csv_writer.writerow(csv_header)
+                csv_writer.writerows(batch.rows(csv_header))
+            else:
+                csv_writer = csv.DictWriter(fp, csv_header)
+                if fp.tell() == 0:
+                    csv_writer.writeheader()
+                csv_writer.writerows(batch)
+
+
+def rotate_csv(output_path: str, csv_header: list):
+    """
+    move an existing csv file aside when its header is not csv_header, so rows are never appended under the wrong columns
+    :param output_path: path of the csv file
+    :param csv_header: headers of the rows to append
+    :return: the new path of the old file, or None if the file is missing or has the same header
+    """
+    try:
+        with open(output_path, newline='', encoding='utf-8-sig') as fp:
+            header = next(csv.reader(fp), None)
+    except FileNotFoundError:
+        return None
+    if header is None or header == list(csv_header):
+        return None
+    root, ext = os.path.splitext(output_path)
+    rotated = f'{root}.{time.strftime("%Y%m%d%H%M%S", time.localtime())}{ext}'
+    os.replace(output_path, rotated)
+    print(f'the header of {output_path} is not {list(csv_header)}, the old file was moved to {rotated}')
+    return rotated
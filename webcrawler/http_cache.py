@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HttpCache:
+    """
+    an on-disk http cache with conditional requests.
+    a response is fresh for its Cache-Control max-age (or Expires); when the server sends no cache headers,
+    the first matching ttl override (url pattern -> seconds) is used instead. a stale response with an ETag or
+    Last-Modified is revalidated with If-None-Match / If-Modified-Since, and a 304 reuses the stored body.
+    parsed results are kept in memory only: a later run downloads nothing for a fresh or unchanged response,
+    but parses its stored body again.
+    only valid responses are stored: a 200 carrying an api error (e.g. a throttled request) should be given a
+    validate function, so the error is not served again until the ttl runs out.
+    """
+
+    def __init__(self, cache_dir: str, ttl: dict = None, reuse_parsed: bool = True, parsed_size: int = 1024):
+        """
+        :param cache_dir: directory of the cache database
+        :param ttl: per-endpoint ttl overrides, {url regex: seconds}, for servers sending no cache headers
+        :param reuse_parsed: reuse the last parsed result of an url when its response comes from the cache (in this process)
+        :param parsed_size: number of parsed results kept in memory
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        self.ttl = {re.compile(pattern): seconds for pattern, seconds in (ttl or {}).items()}
+        self.reuse_parsed = reuse_parsed
+        self.parsed_size = parsed_size
+        self.stats = {'requests': 0, 'hits': 0, 'revalidated': 0, 'misses': 0, 'bytes_saved': 0, 'bytes_downloaded': 0}
+        self._parsed = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(cache_dir, 'http_cache.db'), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS response (
+            url TEXT PRIMARY KEY,
+            headers TEXT, /* json of the response headers */
+            body BLOB,
+            etag TEXT,
+            last_modified TEXT,
+            expires REAL /* epoch time the response is fresh until */
+            )
+        """)
+        self._conn.commit()
+
+    def get(self, url: str, headers: dict = None, params: dict = None, validate=None):
+        """
+        get an url through the cache
+        :param url: the url
+        :param headers: request headers
+        :param params: query params
+        :param validate: a function of a downloaded response, True if the response can be stored,
+                         e.g. it has the expected content type. default to any 200 response
+        :return: a requests.Response, with from_cache = True if the body was not downloaded
+        """
+        url = requests.Request('GET', url, params=params).prepare().url
+        with self._lock:
+            self.stats['requests'] += 1
+            stored = self._conn.execute(
+                'SELECT headers, body, etag, last_modified, expires FROM response WHERE url = ?', (url,)).fetchone()
+        if stored and stored[4] > time.time():
+            return self._hit(url, stored, 'hits')
+
+        headers = dict(headers or {})
+        if stored and stored[2]:
+            headers['If-None-Match'] = stored[2]
+        if stored and stored[3]:
+            headers['If-Modified-Since'] = stored[3]
+        response = requests.get(url, headers=headers)
+
+        if stored and response.status_code == 304:
+            stored_headers = CaseInsensitiveDict(json.loads(stored[0]))
+            stored_headers.update(response.headers)
+            self._store(url, stored_headers, stored[1])
+            return self._hit(url, (json.dumps(dict(stored_headers)), *stored[1:]), 'revalidated')
+
+        with self._lock:
+            self.stats['misses'] += 1
+            self.stats['bytes_downloaded'] += len(response.content)
+        if response.status_code == 200 and (validate is None or validate(response)):
+            self._store(url, response.headers, response.content)
+        response.from_cache = False
+        return response
+
+    def parse(self, response, kind: str, parser):
+        """
+        parse the text of a response, reusing the last result of the same url if the response came from the cache
+        :param response: a response from get()
+        :param kind: name of the parser, e.g. 'bullet'
+        :param parser: a function to parse response.text
+        :return: the parsed result
+        """
+        key = (kind, response.url)
+        with self._lock:
+            if self.reuse_parsed and response.from_cache and key in self._parsed:
+                self._parsed.move_to_end(key)
+                return self._parsed[key]
+        result = parser(response.text)
+        if self.reuse_parsed:
+            with self._lock:
+                self._parsed[key] = result
+                if len(self._parsed) > self.parsed_size:
+                    self._parsed.popitem(last=False)
+        return result
+
+    def report(self):
+        stats = self.stats
+        hit_ratio = (stats['hits'] + stats['revalidated']) / stats['requests'] if stats['requests'] else 0
+        return (f"http cache: {stats['requests']} requests, {stats['hits']} hits, {stats['revalidated']} revalidated, "
+                f"{stats['misses']} misses, hit ratio {hit_ratio:.1%}, "
+                f"{stats['bytes_saved'] / 1024 / 1024:.2f} MB saved, "
+                f"{stats['bytes_downloaded'] / 1024 / 1024:.2f} MB downloaded")
+
+    def _hit(self, url, stored, stat):
+        response_headers, body = json.loads(stored[0]), stored[1]
+        response = requests.models.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers = CaseInsensitiveDict(response_headers)
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = body
+        response.from_cache = True
+        with self._lock:
+            self.stats[stat] += 1
+            self.stats['bytes_saved'] += len(body)
+        return response
+
+    def _store(self, url, response_headers, body):
+        response_headers = CaseInsensitiveDict(response_headers)
+        cache_control = {k.strip().lower(): v.strip('" ') for k, _, v in
+                         (item.partition('=') for item in response_headers.get('Cache-Control', '').split(','))}
+        if 'no-store' in cache_control:
+            return
+        etag, last_modified = response_headers.get('ETag'), response_headers.get('Last-Modified')
+        if 'no-cache' in cache_control:
+            lifetime = 0
+        elif cache_control.get('max-age', '').isdigit():
+            lifetime = int(cache_control['max-age']) - int(response_headers.get('Age', '0') or 0)
+        elif response_headers.get('Expires'):
+            try:
+                lifetime = parsedate_to_datetime(response_headers['Expires']).timestamp() - time.time()
+            except (TypeError, ValueError):
+                lifetime = 0  # invalid Expires means already expired
+        else:
+            lifetime = next((seconds for pattern, seconds in self.ttl.items() if pattern.search(url)), None)
+        if lifetime is None and not (etag or last_modified):
+            return  # nothing to reuse or revalidate
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO response VALUES (?, ?, ?, ?, ?, ?)',
+                               (url, json.dumps(dict(response_headers)), body, etag, last_modified,
+                                time.time() + (lifetime or 0)))
+            self._conn.commit()
+
+
+def http_get(url: str, cache: HttpCache = None, headers: dict = None, params: dict = None, validate=None):
+    """
+    get an url through the cache if there is one, else with requests directly
+    :param url: the url
+    :param cache: a HttpCache or None
+    :param headers: request headers
+    :param params: query params
+    :param validate: a function of a downloaded response, True if the cache can store it, see HttpCache.get()
+    :return: a requests.Response
+    """
+    if cache:
+        return cache.get(url, headers=headers, params=params, validate=validate)
+    return requests.get(url, headers=headers, params=params)
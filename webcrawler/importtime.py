@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+check the startup import budget of the command line entry point with `python -X importtime`, e.g.
+    python -m webcrawler.importtime --budget-ms 800
+exit code 1 if the best (fastest) of the runs of the cli and crawler modules is over budget, or imports pandas / bs4.
+requests and numpy alone take about 250 ms, so the default budget leaves room for slower hosts.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+MODULES = ['webcrawler.cli', 'BaiduSearch.baidu', 'Bilibili.bilibili', 'XimalayaFM.ximalaya']
+FORBIDDEN = ['pandas', 'bs4']  # only imported on the code paths using them
+
+
+def measure(modules: list = None):
+    """
+    import modules in a fresh interpreter with -X importtime
+    :param modules: modules to import, default to MODULES
+    :return: total cumulative import time in ms, a dict of top-level package -> cumulative ms,
+             and a list of all imported modules
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules or MODULES)}'],
+                            cwd=root, capture_output=True, text=True, check=True)
+    packages, imported = {}, []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.append(name.strip())
+        if not name.startswith('  '):  # top-level imports only, nested ones are in their cumulative time
+            packages[name.strip()] = int(cumulative) / 1000
+    return sum(packages.values()), packages, imported
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='check the import time budget of the crawlers')
+    arg_parser.add_argument('--budget-ms', type=float, default=800, help='import time budget in ms')
+    arg_parser.add_argument('--runs', type=int, default=3, help='runs to measure, the best one is used')
+    args = arg_parser.parse_args()
+
+    total, packages, imported = min((measure() for _ in range(args.runs)), key=lambda run: run[0])
+    for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:10]:
+        print(f'{ms:8.1f} ms  {name}')
+    print(f'{total:8.1f} ms  total (budget {args.budget_ms:.0f} ms)')
+
+    forbidden = sorted({name.split('.')[0] for name in imported} & set(FORBIDDEN))
+    if forbidden:
+        sys.exit(f'ERROR: {", ".join(forbidden)} imported at startup, please import them where they are used')
+    if total > args.budget_ms:
+        sys.exit(f'ERROR: import time {total:.1f} ms is over the budget of {args.budget_ms:.0f} ms')
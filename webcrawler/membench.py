@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+measure the memory of parsed rows with tracemalloc, bytes per row of
+    before: a list of dicts with formatted time strings, as the parsers returned them before ColumnBatch
+    after:  the ColumnBatch returned by the parsers (numpy columns, datetime64 times, dictionary-encoded repeats)
+e.g.
+    python -m webcrawler.membench --rows 200000
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from webcrawler.columnar import TIME_FORMAT
+
+
+def _bullet_segments(rows: int, videos: int):
+    """ synthetic protobuf bullets of `videos` videos: (id, progress_ms, ctime, content, user hash) """
+    words = ['哈哈哈哈', '233333', '前方高能', '来了来了', '好耶', 'awsl']
+    now = int(time.time())
+    return [[(index * videos + video, random.randrange(600000), now - random.randrange(86400 * 30),
+              random.choice(words) if index % 2 else f'第{index}条弹幕 {video}', f'{random.randrange(rows // 10):08x}')
+             for index in range(rows // videos)] for video in range(videos)]
+
+
+def _tracks(rows: int, albums: int):
+    """ synthetic tracks of `albums` albums, as in the track json """
+    now = int(time.time() * 1000)
+    return [[{'trackId': album * rows + index, 'title': f'第{index}集 album {album}', 'duration': 1200,
+              'playtimes': random.randrange(10 ** 6), 'likes': random.randrange(1000), 'comments': 0,
+              'createdAt': now - random.randrange(86400000 * 365),
+              'playUrl32': f'http://aod.cos.tx.xmcdn.com/group/M00/{album}/{index}.m4a'}
+             for index in range(rows // albums)] for album in range(albums)]
+
+
+def _bullet_dicts(segments: list, crawl_time: str):
+    bvids = [f'BV1xx411c7{video:03d}' for video in range(len(segments))]
+    return [{'bvid': bvids[video], 'bullet_content': content, 'bullet_entry': progress / 1000,
+             'bullet_time': time.strftime(TIME_FORMAT, time.localtime(ctime)), 'bullet_crawler_time': crawl_time,
+             'bullet_id': bullet_id, 'bullet_user': user}
+            for video, segment in enumerate(segments) for bullet_id, progress, ctime, content, user in segment]
+
+
+def _bullet_batch(segments: list, crawl_time: str):
+    from Bilibili.bilibili import BilibiliParser
+    from webcrawler.columnar import ColumnBatch
+    batches = []
+    for video, segment in enumerate(segments):
+        bullets, _ = BilibiliParser.parser_bullet_segments([segment], crawl_time)
+        batches.append(bullets.insert(0, 'bvid', f'BV1xx411c7{video:03d}'))
+    return ColumnBatch.concat(batches)
+
+
+def _track_dicts(albums: list, crawl_time: str):
+    return [{'album_id': 10 ** 7 + album, 'track_id': track['trackId'], 'track_name': track['title'],
+             'track_duration': track['duration'], 'track_plays': track['playtimes'], 'track_likes': track['likes'],
+             'track_comments': track['comments'],
+             'track_create': time.strftime(TIME_FORMAT, time.localtime(track['createdAt'] / 1000)),
+             'track_audio': track['playUrl32'].replace('http://aod.cos.tx.xmcdn.com/',
+                                                       'https://audiopay.cos.tx.xmcdn.com/download/1.0.0/')}
+            for album, tracks in enumerate(albums) for track in tracks]
+
+
+def _track_batch(albums: list, crawl_time: str):
+    from XimalayaFM.ximalaya import XimalayaFMCrawler
+    from webcrawler.columnar import ColumnBatch
+    return ColumnBatch.concat([XimalayaFMCrawler._parse_tracks(tracks, 10 ** 7 + album)
+                               for album, tracks in enumerate(albums)])
+
+
+def measure(build, *args):
+    """
+    :param build: a function building the rows
+    :return: the rows, and the bytes still allocated by them after building
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        rows = build(*args)
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return rows, size
+
+
+def run(rows: int = 200000):
+    """
+    :param rows: rows of each benchmark
+    :return: a list of (name, bytes per row before, bytes per row after)
+    """
+    crawl_time = time.strftime(TIME_FORMAT, time.localtime())
+    cases = [('bullet', _bullet_segments(rows, 100), _bullet_dicts, _bullet_batch),
+             ('track', _tracks(rows, 50), _track_dicts, _track_batch)]
+    results = []
+    for name, raw, before, after in cases:
+        after(raw[:1], crawl_time)  # import the parsers outside of the measurement
+        records, before_size = measure(before, raw, crawl_time)
+        batch, after_size = measure(after, raw, crawl_time)
+        assert len(records) == len(batch)
+        results.append((name, before_size / len(records), after_size / len(batch)))
+        del records, batch
+    return results
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='bytes per row of parsed results, before and after ColumnBatch')
+    arg_parser.add_argument('--rows', type=int, default=200000, help='rows of each benchmark')
+    args = arg_parser.parse_args()
+    print(f'{"rows":<8}{"before":>12}{"after":>12}  (bytes per row)')
+    for name, before, after in run(args.rows):
+        print(f'{name:<8}{before:12.1f}{after:12.1f}  {before / after:.1f}x smaller')
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+a minimal protobuf wire-format reader, enough to decode known messages (e.g. bilibili danmaku segments)
+without the protobuf package and generated classes.
+"""
+
+
+def read_varint(buf, pos: int):
+    """
+    read a varint
+    :param buf: bytes or memoryview
+    :param pos: position of the varint
+    :return: the value, and the position after the varint
+    :raise ValueError: if the buffer ends inside the varint
+    """
+    result = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ValueError(f'ERROR: truncated protobuf, the buffer ends inside a varint at {pos}')
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def iter_fields(buf):
+    """
+    iterate the fields of a protobuf message
+    :param buf: bytes or memoryview of the message
+    :return: an iterator of (field number, value). varints are ints, other wire types are memoryview slices
+    :raise ValueError: if the message is truncated (a field runs past the end) or has an unsupported wire type
+    """
+    buf = memoryview(buf)
+    pos, end = 0, len(buf)
+    while pos < end:
+        key, pos = read_varint(buf, pos)
+        field, wire_type = key >> 3, key & 0x07
+        if wire_type == 0:  # varint
+            value, pos = read_varint(buf, pos)
+            yield field, value
+            continue
+        if wire_type == 2:  # length-delimited: string, bytes, embedded message, packed repeated
+            length, pos = read_varint(buf, pos)
+        elif wire_type == 1:  # 64-bit
+            length = 8
+        elif wire_type == 5:  # 32-bit
+            length = 4
+        else:
+            raise ValueError(f'ERROR: unsupported protobuf wire type {wire_type} of field {field}')
+        if pos + length > end:
+            raise ValueError(f'ERROR: truncated protobuf, field {field} of {length} bytes at {pos} runs past the end')
+        value, pos = buf[pos: pos + length], pos + length
+        yield field, value
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    allow at most one request per `interval` seconds, shared by all threads using the same limiter.
+    a single thread calling wait() before each request behaves like time.sleep(interval) between requests.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+refresh the counters of crawled items (views / likes / comments of videos, plays / subscribes of albums) by priority.
+the growth rate of an item is estimated from its observations, and the item is due again when its counters are
+expected to have grown by `target_change` (1% by default). due items are dispatched within a request budget per hour,
+so hot items are refreshed often and dead ones rarely, e.g.
+    scheduler = RefreshScheduler('data/refresh.db', budget=600)
+    scheduler.add('video', bvid_list)
+    for kind, key, result in scheduler.run({'video': lambda bvid: crawler.crawl_video([bvid], as_frame=False)}):
+        ...
+"""
+
+import heapq
+import json
+import sqlite3
+import time
+
+from webcrawler.columnar import ColumnBatch
+
+# counters of each kind of item, columns of the crawled results
+FIELDS = {
+    'video': ['views', 'likes', 'comments'],  # BilibiliParser.parser_video()
+    'album': ['album_plays', 'album_subscribes'],  # XimalayaFMCrawler.get_album_detail()
+}
+# requests sent to refresh one item
+COSTS = {'video': 1, 'album': 5}
+
+
+class RefreshScheduler:
+    """
+    a priority queue of items by next due time, kept in a sqlite database so that schedules survive restarts
+    """
+
+    def __init__(self, db_path: str, budget: int = 600, target_change: float = 0.01, first_interval: float = 3600,
+                 min_interval: float = 600, max_interval: float = 7 * 86400, smoothing: float = 0.5):
+        """
+        :param db_path: path of the sqlite database of schedules and last-seen counters
+        :param budget: requests per hour, see COSTS
+        :param target_change: relative growth of a counter expected before an item is refreshed again
+        :param first_interval: seconds between the first two observations of an item, before its rate is known
+        :param min_interval: minimum seconds between two refreshes of an item
+        :param max_interval: maximum seconds between two refreshes of an item, e.g. of items no longer growing
+        :param smoothing: weight of the latest growth in the estimated rate (exponential moving average)
+        """
+        self.budget = budget
+        self.target_change = target_change
+        self.first_interval = first_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.smoothing = smoothing
+        self.stats = {'dispatched': 0, 'revisited': 0, 'changed': 0, 'failed': 0}
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS refresh (
+            kind TEXT,
+            key TEXT,
+            stats TEXT, /* json of the last-seen counters */
+            seen REAL, /* epoch time of the last observation */
+            rate REAL, /* estimated relative growth per hour */
+            due REAL, /* epoch time of the next refresh */
+            PRIMARY KEY (kind, key)
+            )
+        """)
+        self._due = {}  # (kind, key) -> due time, to skip outdated entries of the queues
+        self._queues = {kind: [] for kind in FIELDS}  # kind -> heap of (due time, key)
+        for kind, key, due in self.conn.execute('SELECT kind, key, due FROM refresh'):
+            self._push(kind, key, due)
+
+    def __len__(self):
+        return len(self._due)
+
+    def close(self):
+        self.conn.close()
+
+    def _push(self, kind: str, key: str, due: float):
+        self._due[(kind, key)] = due
+        heapq.heappush(self._queues[kind], (due, key))
+
+    def _head(self, kind: str):
+        queue = self._queues[kind]
+        while queue and self._due.get((kind, queue[0][1])) != queue[0][0]:
+            heapq.heappop(queue)
+        return queue[0] if queue else None
+
+    def add(self, kind: str, keys: list):
+        """
+        add items to refresh. new items are due now, known items keep their schedule
+        :param kind: one of FIELDS
+        :param keys: ids of the items, e.g. bvid of videos or album ids
+        """
+        if kind not in FIELDS:
+            raise ValueError(f'ERROR: kind {kind} can not be refreshed! Please use one of {list(FIELDS)}')
+        now = time.time()
+        for key in map(str, keys):
+            if (kind, key) not in self._due:
+                self.conn.execute('INSERT OR IGNORE INTO refresh (kind, key, due) VALUES (?, ?, ?)', (kind, key, now))
+                self._push(kind, key, now)
+        self.conn.commit()
+
+    def observe(self, kind: str, key, result, seen: float = None):
+        """
+        record the counters of an item, update its growth rate and schedule its next refresh
+        :param kind: one of FIELDS
+        :param key: id of the item
+        :param result: a one-row ColumnBatch from the crawler, or a dict of counters
+        :param seen: epoch time of the observation, default to now
+        :return: epoch time of the next refresh
+        """
+        key, seen = str(key), seen or time.time()
+        stats = {field: int(result[field][0] if isinstance(result, ColumnBatch) else result[field])
+                 for field in FIELDS[kind]}
+        row = self.conn.execute('SELECT stats, seen, rate FROM refresh WHERE kind = ? AND key = ?',
+                                (kind, key)).fetchone()
+        rate = None
+        if row and row[0]:
+            previous, hours = json.loads(row[0]), max(seen - row[1], 1) / 3600
+            # the fastest growing counter, relative to its last-seen value
+            growth = max(max(value - previous.get(field, 0), 0) / max(previous.get(field, 0), 1)
+                         for field, value in stats.items()) / hours
+            rate = growth if row[2] is None else self.smoothing * growth + (1 - self.smoothing) * row[2]
+            self.stats['revisited'] += 1
+            self.stats['changed'] += stats != previous
+
+        if rate is None:
+            interval = self.first_interval
+        else:
+            interval = self.target_change / rate * 3600 if rate > 0 else self.max_interval
+        due = seen + min(max(interval, self.min_interval), self.max_interval)
+        self.conn.execute('INSERT OR REPLACE INTO refresh (kind, key, stats, seen, rate, due) VALUES (?, ?, ?, ?, ?, ?)',
+                          (kind, key, json.dumps(stats), seen, rate, due))
+        self.conn.commit()
+        self._push(kind, key, due)
+        return due
+
+    def postpone(self, kind: str, key, seconds: float = None):
+        """ try an item again later, e.g. after a failed request. default to min_interval """
+        key, due = str(key), time.time() + (seconds or self.min_interval)
+        self.conn.execute('UPDATE refresh SET due = ? WHERE kind = ? AND key = ?', (due, kind, key))
+        self.conn.commit()
+        self._push(kind, key, due)
+
+    def next_due(self, kinds: list = None):
+        """
+        :param kinds: kinds of items to look at, default to all
+        :return: (due time, kind, key) of the item due first, or None if there is no item
+        """
+        heads = [(head[0], kind, head[1]) for kind in kinds or FIELDS for head in [self._head(kind)] if head]
+        return min(heads) if heads else None
+
+    def run(self, fetchers: dict, hours: float = None):
+        """
+        dispatch due items, the most overdue first, within the request budget per hour
+        :param fetchers: {kind: function(key) -> a one-row ColumnBatch with the counters of FIELDS[kind]}
+        :param hours: stop after hours, default to run forever
+        :return: an iterator of (kind, key, result)
+        """
+        end = time.time() + hours * 3600 if hours else float('inf')
+        slot = time.monotonic()  # earliest time of the next request within the budget
+        while True:
+            head = self.next_due(list(fetchers))
+            if not head:
+                return
+            due, kind, key = head
+            wait = max(due - time.time(), slot - time.monotonic(), 0)
+            if time.time() + wait >= end:
+                return
+            if wait:
+                time.sleep(wait)
+            if self.next_due(list(fetchers)) != head:  # rescheduled meanwhile
+                continue
+            slot = max(slot, time.monotonic()) + COSTS[kind] * 3600 / self.budget
+            self.stats['dispatched'] += 1
+            try:
+                result = fetchers[kind](key)
+                self.observe(kind, key, result)
+            except (OSError, ValueError, KeyError, IndexError) as e:
+                self.stats['failed'] += 1
+                print(f'failed to refresh {kind} {key}: {e!r}, try again later')
+                self.postpone(kind, key)
+                continue
+            yield kind, key, result
+
+    def report(self):
+        """ refreshes dispatched, and the share of revisits finding changed counters """
+        revisited, changed = self.stats['revisited'], self.stats['changed']
+        share = f'{changed / revisited:.1%}' if revisited else 'n/a'
+        return f'refresh: {self.stats["dispatched"]} dispatched, {changed} of {revisited} revisits changed ({share}), ' \
+               f'{self.stats["failed"]} failed, {len(self)} items scheduled'
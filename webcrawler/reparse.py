@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+
+import argparse
+import json
+import time
+
+from webcrawler.archive import RawArchive
+from webcrawler.columnar import ColumnBatch, TIME_FORMAT, save_batch
+
+
+def _parse_news(body, key, crawl_time):
+    from bs4 import BeautifulSoup
+    from BaiduSearch.baidu import BaiduCrawler, BaiduParser
+    soup = BeautifulSoup(body.decode('utf-8'), "html.parser")
+    if BaiduCrawler._check_page(soup) == 'captcha':
+        return None, None
+    news, csv_header = BaiduParser.parse_news(soup, crawl_time)
+    news.insert(len(news.header), 'search_word', key)
+    return news, csv_header
+
+
+def _parse_channel(body, key, crawl_time):
+    from Bilibili.bilibili import BilibiliParser
+    return BilibiliParser.parser_channel(json.loads(body), crawl_time)
+
+
+def _parse_video(body, key, crawl_time):
+    from Bilibili.bilibili import BilibiliParser
+    return BilibiliParser.parser_video(*BilibiliParser._extract_video(body.decode('utf-8')), crawl_time)
+
+
+def _parse_comment(body, key, crawl_time):
+    from Bilibili.bilibili import BilibiliParser
+    comment_result = json.loads(body)['data']['replies']
+    if not comment_result:
+        return None, None
+    comments, csv_header = BilibiliParser.parser_comment(comment_result, crawl_time)
+    comments.insert(0, 'bvid', key)
+    csv_header.insert(0, 'bvid')
+    return comments, csv_header
+
+
+def _parse_bullet(body, key, crawl_time):
+    from Bilibili.bilibili import BilibiliParser
+    bullets, csv_header = BilibiliParser.parser_bullet(BilibiliParser._extract_bullet(body.decode('utf-8')),
+                                                       crawl_time)
+    bullets.insert(0, 'bvid', key)
+    csv_header.insert(0, 'bvid')
+    return bullets, csv_header
+
+
+def _parse_bullet_segment(body, key, crawl_time):
+    from Bilibili.bilibili import BilibiliParser
+    bullets, csv_header = BilibiliParser.parser_bullet_segments([BilibiliParser._extract_bullet_segment(body)],
+                                                                crawl_time)
+    bullets.insert(0, 'bvid', key)
+    csv_header.insert(0, 'bvid')
+    return bullets, csv_header
+
+
+def _parse_category(body, key, crawl_time):
+    from XimalayaFM.ximalaya import XimalayaFMCrawler
+    category, subcategory = key.split('/', 1)
+    albums = XimalayaFMCrawler._parse_albums(json.loads(body)['data']['albums'], category, subcategory or None)
+    return albums, albums.header
+
+
+def _parse_track(body, key, crawl_time):
+    from XimalayaFM.ximalaya import XimalayaFMCrawler
+    tracks = XimalayaFMCrawler._parse_tracks(json.loads(body)['data']['list'], int(key))
+    return tracks, tracks.header
+
+
+# archive kind -> parser(body, key, crawl_time) returning (ColumnBatch, csv_header)
+PARSERS = {
+    'news': _parse_news,  # BaiduSearch, key = search word
+    'channel': _parse_channel,  # Bilibili, key = channel url
+    'video': _parse_video,  # Bilibili, key = bvid
+    'comment': _parse_comment,  # Bilibili, key = bvid
+    'reply': _parse_comment,  # Bilibili, replies of a comment, key = bvid
+    'bullet': _parse_bullet,  # Bilibili, key = bvid
+    'bullet_segment': _parse_bullet_segment,  # Bilibili, protobuf bullets, key = bvid
+    'category': _parse_category,  # XimalayaFM, key = category/subcategory
+    'track': _parse_track,  # XimalayaFM, key = album id
+}
+
+
+def reparse(archive_dir: str, kind: str, output_path: str = None, flush_rows: int = 100000):
+    """
+    stream archived raw responses back through the parsers, without crawling again
+    :param archive_dir: the archive directory passed to the crawler (archive_dir=...)
+    :param kind: which kind of responses to re-parse, one of PARSERS
+    :param output_path: path to save the csv results, default to None
+    :param flush_rows: rows kept in memory before they are written to the csv file
+    :return: if no output path, return a pandas.DataFrame; else, return the number of rows saved in the output path
+    """
+    if kind not in PARSERS:
+        raise ValueError(f'ERROR: kind {kind} can not be re-parsed! Please use one of {list(PARSERS)}')
+    parser = PARSERS[kind]
+    archive = RawArchive(archive_dir)
+
+    batches, pending, total, csv_header = [], 0, 0, None
+    for entry, body in archive.records(kind):
+        crawl_time = time.strftime(TIME_FORMAT, time.localtime(entry['fetch_time']))
+        try:
+            batch, header = parser(body, entry['key'], crawl_time)
+        except (ValueError, KeyError, TypeError) as e:
+            print(f'failed to parse {entry["url"]} fetched at {crawl_time}: {e!r}, pass!')
+            continue
+        if not batch:
+            continue
+        csv_header = header
+        batches.append(batch)
+        pending += len(batch)
+        if output_path and pending >= flush_rows:
+            save_batch(ColumnBatch.concat(batches), output_path, csv_header)
+            total, batches, pending = total + pending, [], 0
+            print(f'Successfully re-parse {total} rows of {kind} to {output_path}')
+
+    if not output_path:
+        return ColumnBatch.concat(batches).to_frame()
+    if batches:
+        save_batch(ColumnBatch.concat(batches), output_path, csv_header)
+        total += pending
+    print(f'Successfully re-parse {total} rows of {kind} to {output_path}')
+    return total
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='re-parse archived raw responses without crawling again')
+    arg_parser.add_argument('archive_dir', help='the archive directory passed to the crawler')
+    arg_parser.add_argument('kind', choices=list(PARSERS), help='which kind of responses to re-parse')
+    arg_parser.add_argument('-o', '--output', required=True, help='path to save the csv results')
+    args = arg_parser.parse_args()
+    reparse(args.archive_dir, args.kind, args.output)
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# Author: Ying Wang
+# Date: 2026/10/19
+"""
+a pool of identities (cookie + user agent profiles) to spread requests over, e.g.
+    pool = SessionPool([{'cookie': 'BDUSS=...'}, {'cookie': 'BDUSS=...', 'user_agent': '...', 'interval': 2}])
+    with pool.session() as identity:
+        identity.limiter.wait()
+        response = identity.session.get(url)
+    pool.succeed(identity)  # or pool.fail(identity, reason, quarantine=True) if the response is blocked
+each identity has its own rate limit, so throughput grows with the number of identities.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from webcrawler.ratelimit import RateLimiter
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit' \
+             '/537.36 (KHTML, like Gecko) Chrome/69.0.3497.100 Safari/537.36'
+
+
+class Identity:
+    """ one profile: its own session (cookies), user agent, rate limit and health score """
+
+    def __init__(self, name: str, cookie: str = '', user_agent: str = USER_AGENT, interval: float = 1.0):
+        self.name = name
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        if cookie:
+            self.session.headers['Cookie'] = cookie
+        self.limiter = RateLimiter(interval)
+        self.health = 1.0  # 1 = healthy, halved by each failure and recovered by successes
+        self.in_flight = 0  # requests being sent with this identity
+        self.strikes = 0  # quarantines in a row, each one twice as long as the last
+        self.quarantined_until = 0
+        self.stats = {'ok': 0, 'failed': 0, 'quarantined': 0}
+
+
+class SessionPool:
+    """
+    route requests to the least-loaded healthy identity. an identity is quarantined when it is blocked (e.g. a captcha
+    page), or when its health drops below min_health after repeated suspect responses (e.g. empty result pages)
+    """
+
+    def __init__(self, profiles: list, interval: float = 1.0, quarantine: float = 600, min_health: float = 0.3):
+        """
+        :param profiles: a list of {'cookie': ..., 'user_agent': ..., 'interval': ...}, only cookie is required
+        :param interval: default seconds between two requests of an identity
+        :param quarantine: seconds of the first quarantine of an identity, doubled for each quarantine in a row
+        :param min_health: identities below this health score are quarantined
+        """
+        if not profiles:
+            raise ValueError('ERROR: please give at least one profile')
+        self.identities = [Identity(name=f'identity {index + 1}', cookie=profile.get('cookie', ''),
+                                    user_agent=profile.get('user_agent') or USER_AGENT,
+                                    interval=profile.get('interval', interval))
+                           for index, profile in enumerate(profiles)]
+        self.quarantine = quarantine
+        self.min_health = min_health
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return len(self.identities)
+
+    def acquire(self):
+        """ the least-loaded identity not in quarantine, waiting for the end of a quarantine if all of them are """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                ready = [identity for identity in self.identities if identity.quarantined_until <= now]
+                if ready:
+                    identity = min(ready, key=lambda item: (item.in_flight, -item.health))
+                    identity.in_flight += 1
+                    return identity
+                wait = min(identity.quarantined_until for identity in self.identities) - now
+                print(f'all identities are quarantined, wait {wait:.0f} seconds')
+                self._condition.wait(wait)
+
+    def release(self, identity: Identity):
+        with self._condition:
+            identity.in_flight -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def session(self):
+        identity = self.acquire()
+        try:
+            yield identity
+        finally:
+            self.release(identity)
+
+    def succeed(self, identity: Identity):
+        with self._condition:
+            identity.stats['ok'] += 1
+            identity.health = min(1.0, identity.health + 0.25)
+            identity.strikes = 0
+
+    def fail(self, identity: Identity, reason: str, quarantine: bool = False):
+        """
+        :param identity: the identity of the failed request
+        :param reason: shown in the log
+        :param quarantine: quarantine the identity now, e.g. it is asked for a captcha. otherwise only lower its health
+        """
+        with self._condition:
+            identity.stats['failed'] += 1
+            identity.health /= 2
+            if not (quarantine or identity.health < self.min_health):
+                print(f'{identity.name}: {reason}, health {identity.health:.2f}')
+                return
+            seconds = self.quarantine * 2 ** identity.strikes
+            identity.quarantined_until = time.monotonic() + seconds
+            identity.strikes += 1
+            identity.stats['quarantined'] += 1
+            identity.health = 0.5  # back on probation after the quarantine
+            print(f'{identity.name}: {reason}, quarantined for {seconds:.0f} seconds')
+
+    def report(self):
+        return '\n'.join(f'{identity.name}: {identity.stats["ok"]} ok, {identity.stats["failed"]} failed, '
+                         f'{identity.stats["quarantined"]} quarantines, health {identity.health:.2f}'
+                         for identity in self.identities)